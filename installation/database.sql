@@ -11,6 +11,7 @@ CREATE TABLE exercise.bookmarks (
 	lon real,
 	label varchar(15),
 	size smallint CHECK (size >= 1 AND size <= 5),  
+	state varchar(100),
 	geom geometry(POINT,4326)
 	);	
 GRANT ALL PRIVILEGES ON TABLE exercise.bookmarks TO "user";
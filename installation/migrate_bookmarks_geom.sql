@@ -0,0 +1,12 @@
+-- Migration for bookmarks tables created by older versions of the program
+-- Older versions set the geometry with an UPDATE after every insert; new versions build it in the INSERT.
+-- Run once with psql connected to the "exercise" database: \i migrate_bookmarks_geom.sql
+BEGIN;
+-- fill the geometry of the rows inserted without one
+UPDATE exercise.bookmarks SET geom = ST_SetSRID(ST_MakePoint(lon, lat), 4326)
+	WHERE geom IS NULL AND lon IS NOT NULL AND lat IS NOT NULL;
+-- make sure the spatial index exists
+CREATE INDEX IF NOT EXISTS idx_bookmarks_geom ON exercise.bookmarks USING GIST(geom);
+COMMIT;
+-- reclaim the space left by the old full table updates and refresh the statistics
+VACUUM ANALYZE exercise.bookmarks;
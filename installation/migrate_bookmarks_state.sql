@@ -0,0 +1,16 @@
+-- Migration for bookmarks tables created by older versions of the program
+-- New versions store the name of the state containing each bookmark.
+-- Run once with psql connected to the "exercise" database: \i migrate_bookmarks_state.sql
+BEGIN;
+ALTER TABLE exercise.bookmarks ADD COLUMN IF NOT EXISTS state varchar(100);
+-- fill the state of the existing bookmarks if the subdivided states table was already created by the program
+DO $$
+BEGIN
+	IF to_regclass('exercise.states_subdivided') IS NOT NULL THEN
+		UPDATE exercise.bookmarks AS b SET state = (SELECT s.name FROM exercise.states_subdivided AS s
+		                                            WHERE ST_Intersects(s.geom, b.geom) LIMIT 1)
+			WHERE b.state IS NULL AND b.geom IS NOT NULL;
+	END IF;
+END
+$$;
+COMMIT;
@@ -0,0 +1,611 @@
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name:        benchmark.py
+# Purpose:     timing of the database and rendering code paths,
+#               run as "python benchmark.py name" where name is one of the BENCHMARKS keys
+#               or without arguments to run all of them
+#
+# Author:      claudio piccinini
+#
+# Updated:     18/10/2026
+#-------------------------------------------------------------------------------
+import sys
+import time
+
+import utils
+import settings
+
+
+def timeit(function, repeat):
+    """
+    Call a function several times
+    :param function: a function without parameters
+    :param repeat: number of calls
+    :return: a tuple with (total seconds, mean milliseconds per call)
+    """
+    start = time.perf_counter()
+    for i in range(repeat):
+        function()
+    total = time.perf_counter() - start
+    return total, total / repeat * 1000
+
+
+def report(name, total, percall, extra=""):
+    """ print one benchmark line """
+    print("{:<40} total {:>9.3f} s   per call {:>9.3f} ms {}".format(name, total, percall, extra))
+
+
+# copy of the bookmarks table used by the benchmarks
+BENCH_TABLE = settings.BOOKMARKS_TABLE_NAME + "_bench"
+
+
+def create_bench_table(cur):
+    """
+    Create an empty copy of the bookmarks table, replacing an old one
+    :param cur: a database cursor, the caller commits
+    :return: None
+    """
+    cur.execute("DROP TABLE IF EXISTS " + BENCH_TABLE)
+    cur.execute("CREATE TABLE " + BENCH_TABLE + " (LIKE " + settings.BOOKMARKS_TABLE_NAME + " INCLUDING CONSTRAINTS)")
+    # own id sequence, dropped with the table
+    cur.execute("CREATE SEQUENCE " + BENCH_TABLE + "_id_seq OWNED BY " + BENCH_TABLE + ".id")
+    cur.execute("ALTER TABLE " + BENCH_TABLE + " ALTER COLUMN id SET DEFAULT nextval('" + BENCH_TABLE + "_id_seq')")
+    cur.execute("ALTER TABLE " + BENCH_TABLE + " ADD PRIMARY KEY (id)")
+    cur.execute("CREATE INDEX ON " + BENCH_TABLE + " USING GIST(geom)")
+
+
+def fill_bench_table(cur, size):
+    """
+    Grow the benchmark table to the requested size with random points in the USA extent
+    :param cur: a database cursor, the caller commits
+    :param size: number of rows
+    :return: the number of rows in the table
+    """
+    cur.execute("SELECT count(*) FROM " + BENCH_TABLE)
+    rows = cur.fetchone()[0]
+    cur.execute("""INSERT INTO """ + BENCH_TABLE + """(lat, lon, label, size, geom)
+                   SELECT lat, lon, 'fill', 1, ST_SetSRID(ST_MakePoint(lon, lat), 4326)
+                   FROM (SELECT 25 + random() * 24 AS lat, -124 + random() * 57 AS lon
+                         FROM generate_series(1, %s)) AS p""", (max(size - rows, 0),))
+    cur.execute("ANALYZE " + BENCH_TABLE)
+    cur.execute("SELECT count(*) FROM " + BENCH_TABLE)
+    return cur.fetchone()[0]
+
+
+def bench_connections(repeat=200):
+    """
+    Compare a new connection for every query (the old behaviour) with a pooled connection
+    :param repeat: number of queries
+    :return: None
+    """
+
+    def unpooled():
+        conn = utils.pgconnect(**settings.DEFAULT_CONNECTION)
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.fetchone()
+        cur.close()
+        conn.close()
+
+    def pooled():
+        with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+            cur.execute("SELECT 1")
+            cur.fetchone()
+
+    pooled()  # warm up the pool
+    total, percall = timeit(unpooled, repeat)
+    report("new connection per query", total, percall)
+    total2, percall2 = timeit(pooled, repeat)
+    report("pooled connection", total2, percall2, "(x{:.1f})".format(percall / percall2))
+
+
+def bench_insert_scaling(sizes=(1000, 10000, 100000, 1000000), repeat=200, repeat_old=5):
+    """
+    Show the insert latency does not grow with the table size
+    Inserts go to a copy of the bookmarks table that is dropped at the end, the old insert + update of every row
+    is run only a few times for each size because it gets slower as the table grows
+    :param sizes: table sizes to test
+    :param repeat: number of inserts for each size
+    :param repeat_old: number of old style inserts for each size
+    :return: None
+    """
+
+    table = BENCH_TABLE
+
+    with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+        try:
+            create_bench_table(cur)
+            conn.commit()
+
+            utils.pgprepare(cur, "insert_bookmark_bench",
+                            "INSERT INTO " + table + "(lat, lon, label, size, geom) "
+                            "VALUES ($1, $2, $3, $4, ST_SetSRID(ST_MakePoint($2, $1), 4326)) RETURNING id",
+                            ["float8", "float8", "varchar", "smallint"])
+
+            def new():
+                cur.execute("EXECUTE insert_bookmark_bench (%s, %s, %s, %s)", ("40.1234", "-100.1234", "bench", 1))
+                cur.fetchone()
+                conn.commit()
+
+            def old():
+                cur.execute("INSERT INTO " + table + "(lat,lon,label,size) VALUES (%s,%s,%s,%s) RETURNING id",
+                            ("40.1234", "-100.1234", "bench", 1))
+                cur.execute("UPDATE " + table + " SET geom = ST_PointFromText('POINT(' || lon || ' ' || lat || ')', 4326)")
+                conn.commit()
+
+            for size in sizes:
+                rows = fill_bench_table(cur, size)
+                conn.commit()
+
+                total, percall = timeit(new, repeat)
+                report("insert, " + str(rows) + " rows", total, percall)
+                rows += repeat
+                if repeat_old:
+                    total, percall = timeit(old, repeat_old)
+                    report("insert + update all, " + str(rows) + " rows", total, percall)
+                    rows += repeat_old
+
+        finally:
+            conn.rollback()
+            cur.execute("DROP TABLE IF EXISTS " + table)
+            conn.commit()
+
+
+def bench_streaming(sizes=(10000, 1000000, 10000000), fetchall_max=1000000):
+    """
+    Compare peak python memory and throughput of reading all the bookmarks with fetchall, with pages
+    and with a server side cursor; fetchall is skipped for tables bigger than fetchall_max
+    :param sizes: table sizes to test
+    :param fetchall_max: biggest table read with fetchall
+    :return: None
+    """
+    import tracemalloc
+    import bookmarks
+
+    def fetchall():
+        with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+            cur.execute("SELECT id, lon, lat, label, size FROM " + BENCH_TABLE)
+            for row in cur.fetchall():
+                pass
+
+    def pages():
+        for row in bookmarks.iter_bookmarks(stream=False, tablename=BENCH_TABLE):
+            pass
+
+    def stream():
+        for row in bookmarks.iter_bookmarks(stream=True, tablename=BENCH_TABLE):
+            pass
+
+    with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+        try:
+            create_bench_table(cur)
+            conn.commit()
+            for size in sizes:
+                rows = fill_bench_table(cur, size)
+                conn.commit()
+                for name, function in (("fetchall", fetchall), ("pages", pages), ("server side cursor", stream)):
+                    if function is fetchall and rows > fetchall_max:
+                        continue
+                    tracemalloc.start()
+                    total, _ = timeit(function, 1)
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                    report(name + ", " + str(rows) + " rows", total, total / rows * 1000,
+                           "{:>10.0f} rows/s  peak {:>8.1f} MB".format(rows / total, peak / 2 ** 20))
+        finally:
+            conn.rollback()
+            cur.execute("DROP TABLE IF EXISTS " + BENCH_TABLE)
+            conn.commit()
+
+
+def bench_containment(repeat=500, batch=100000):
+    """
+    Compare the PostGIS point in USA query with the in memory states index, for single points and for a batch
+    Points are random in the bounding box of the lower 48 states
+    :param repeat: number of single point checks
+    :param batch: number of points checked at once
+    :return: None
+    """
+    import numpy as np
+    import containment
+
+    index = containment.StatesIndex.from_database()
+    rng = np.random.RandomState(0)
+    x = rng.uniform(-124, -67, batch)
+    y = rng.uniform(25, 49, batch)
+    points = iter(zip(x.tolist(), y.tolist()))
+
+    with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+
+        def sql():
+            px, py = next(points)
+            cur.execute("""select result from
+                            (select st_contains(s.geom,ST_GeomFromText('POINT(%s %s)', 4326)) as result
+                              from """ + settings.STATES_TABLE_NAME + """ as s) as subquery
+                              where result is true""", (px, py))
+            cur.fetchone()
+
+        def memory():
+            px, py = next(points)
+            index.contains(px, py)
+
+        total, percall = timeit(sql, repeat)
+        report("PostGIS st_contains", total, percall)
+        total2, percall2 = timeit(memory, repeat)
+        report("in memory index", total2, percall2, "(x{:.1f})".format(percall / percall2))
+
+        total3, _ = timeit(lambda: index.contains_many(x, y), 1)
+        report("in memory index, batch of " + str(batch), total3, total3 / batch * 1000)
+
+        def sqlbatch():
+            cur.execute("""SELECT count(*) FROM unnest(%s::float8[], %s::float8[]) AS p(lon, lat)
+                            WHERE EXISTS (SELECT 1 FROM """ + settings.STATES_TABLE_NAME + """ AS s
+                                           WHERE ST_Contains(s.geom, ST_SetSRID(ST_MakePoint(p.lon, p.lat), 4326)))""",
+                        (x.tolist(), y.tolist()))
+            cur.fetchone()
+
+        total4, _ = timeit(sqlbatch, 1)
+        report("PostGIS set based, batch of " + str(batch), total4, total4 / batch * 1000)
+
+
+def bench_simplify(browser=True):
+    """
+    Report the html size, the time to write the page and the browser load time for each states simplification level
+    and for the full resolution geometry
+    :param browser: if True also open each page with settings.BROWSER and read the page load time
+    :return: None
+    """
+    import os
+    import tempfile
+    import main
+
+    folder = tempfile.mkdtemp()
+    driver = None
+    try:
+        levels = [None] + list(range(len(settings.SIMPLIFY_LEVELS)))
+        for level in levels:
+            if level is None:
+                name, zoom = "full resolution", None
+            else:
+                zoom = settings.SIMPLIFY_LEVELS[level][0]
+                name = "level " + str(level) + " " + str(settings.SIMPLIFY_LEVELS[level])
+
+            start = time.perf_counter()
+            map = main.simple_map(zoom=settings.MAP_ZOOM if zoom is None else zoom)
+            main.add_geojson(map, main.get_geojson(zoom), utils.style_function)
+            path = main.save_map(map, name="level" + str(level) + ".html", folder=folder)
+            total = time.perf_counter() - start
+
+            extra = "html {:>8.0f} KB".format(os.path.getsize(path) / 1024)
+            if browser:
+                if driver is None:
+                    driver = main.browser(path, settings.BROWSER)
+                else:
+                    driver.get("file:///" + path)
+                load = driver.execute_script(
+                    "var t = window.performance.timing; return t.loadEventEnd - t.navigationStart;")
+                extra += "   browser load {:>7.0f} ms".format(load)
+            report(name, total, total * 1000, extra)
+    finally:
+        if driver: driver.quit()
+
+
+def bench_geojson_cache(zoom=settings.MAP_ZOOM, repeat=5):
+    """
+    Time the states geojson download at startup with a cold cache (database query) and a warm cache (disk file)
+    :param zoom: map zoom of the geojson
+    :param repeat: number of startups
+    :return: None
+    """
+    import main
+
+    def cold():
+        main.invalidate_geojson()
+        main.get_geojson(zoom)
+
+    def warm():
+        # a new process has an empty memory cache and does not know the table fingerprint
+        main.GEOJSON.clear()
+        main.GEOJSON_VERSION = None
+        main.get_geojson(zoom)
+
+    total, percall = timeit(cold, repeat)
+    report("cold cache", total, percall)
+    total2, percall2 = timeit(warm, repeat)
+    report("warm cache", total2, percall2, "(x{:.1f})".format(percall / percall2))
+
+
+def bench_render(sizes=(1000, 10000, 100000), markers_max=100000):
+    """
+    Report the html size, the time to write the page and the browser render time of the bookmarks drawn
+    as font-awesome markers and as circles on a canvas; the render time is measured from the navigation start
+    to the first frame painted after the page load
+    Points are random in the bounding box of the lower 48 states
+    :param sizes: number of bookmarks
+    :param markers_max: biggest number of bookmarks drawn as markers
+    :return: None
+    """
+    import os
+    import tempfile
+    import numpy as np
+    import main
+
+    rng = np.random.RandomState(0)
+    folder = tempfile.mkdtemp()
+    driver = None
+    try:
+        for size in sizes:
+            points = list(zip(rng.uniform(-124, -67, size).tolist(), rng.uniform(25, 49, size).tolist(),
+                              rng.randint(1, 6, size).tolist(), ["bookmark " + str(i) for i in range(size)]))
+            for renderer in ("markers", "canvas"):
+                if renderer == "markers" and size > markers_max:
+                    continue
+                start = time.perf_counter()
+                map = main.simple_map()
+                main.add_points(map, points, renderer=renderer)
+                path = main.save_map(map, name=renderer + str(size) + ".html", folder=folder)
+                total = time.perf_counter() - start
+
+                if driver is None:
+                    driver = main.browser(path, settings.BROWSER, size=settings.MAP_SIZE)
+                else:
+                    driver.get("file:///" + path)
+                render = driver.execute_async_script("""
+                    var done = arguments[0];
+                    requestAnimationFrame(function() { requestAnimationFrame(function() { done(performance.now()); }); });""")
+                report(renderer + ", " + str(size) + " bookmarks", total, total * 1000,
+                       "html {:>8.0f} KB   browser render {:>7.0f} ms".format(os.path.getsize(path) / 1024, render))
+    finally:
+        if driver: driver.quit()
+
+
+def bench_plot_points(sizes=(1000, 10000, 100000), loop_max=10000):
+    """
+    Compare the time to draw bookmarks with matplotlib one at a time and all at once, with and without labels;
+    all at once draws at most settings.PLOT_LABELS_MAX labels.
+    The time includes rendering the figure to a png in memory
+    Points are random in the bounding box of the lower 48 states
+    :param sizes: number of bookmarks
+    :param loop_max: biggest number of bookmarks drawn one at a time
+    :return: None
+    """
+    import io
+    import numpy as np
+    import matplotlib
+    matplotlib.use("Agg")
+    import secondary
+
+    rng = np.random.RandomState(0)
+    for size, labels in ((s, l) for s in sizes for l in (True, False)):
+        points = list(zip(rng.uniform(-124, -67, size).tolist(), rng.uniform(25, 49, size).tolist(),
+                          rng.randint(1, 6, size).tolist(),
+                          ["bookmark " + str(i) if labels else "" for i in range(size)]))
+        name = str(size) + " bookmarks" + (" with labels" if labels else " without labels")
+        times = {}
+        for vectorized in (False, True):
+            if not vectorized and size > loop_max:
+                continue
+            plt, map = secondary.plot_states()  # the states are cached, not timed
+
+            def draw():
+                secondary.add_points(plt, map, points, vectorized=vectorized)
+                plt.gcf().savefig(io.BytesIO(), format="png", dpi=100)
+
+            times[vectorized], _ = timeit(draw, 1)
+            plt.close("all")
+        if False in times:
+            report("one at a time, " + name, times[False], times[False] / size * 1000)
+        report("all at once, " + name, times[True], times[True] / size * 1000,
+               "(x{:.1f})".format(times[False] / times[True]) if False in times else "")
+
+
+def bench_unzip(urls=("http://www2.census.gov/geo/tiger/GENZ2016/shp/cb_2016_us_state_20m.zip",
+                       "http://www2.census.gov/geo/tiger/GENZ2016/shp/cb_2016_us_state_500k.zip",
+                       "http://www2.census.gov/geo/tiger/GENZ2016/shp/cb_2016_us_county_500k.zip",
+                       "http://www2.census.gov/geo/tiger/GENZ2016/shp/cb_2016_06_tract_500k.zip")):
+    """
+    Compare peak python memory and time of reading a zipped shapefile: unzip reading each file in memory,
+    unzip a chunk at a time, and no unzip reading the features through /vsizip/
+    Files are downloaded once in the cache folder; GDAL memory is not seen by tracemalloc
+    :param urls: urls of zipped shapefiles
+    :return: None
+    """
+    import os
+    import shutil
+    import zipfile
+    import tempfile
+    import tracemalloc
+    from osgeo import ogr
+    import geocache
+    import download
+    import main
+
+    def count(path):
+        dataset = ogr.GetDriverByName('ESRI Shapefile').Open(path, 0)
+        layer = dataset.GetLayer()
+        features = 0
+        for feature in layer:
+            features += 1
+        dataset = None
+        return features
+
+    for url in urls:
+        folder = geocache.get_folder()
+        file_name = url.split("/")[-1]
+        download.fetch(download.get_urls(url), folder + "/" + file_name)
+        size = os.path.getsize(folder + "/" + file_name) / 2 ** 20
+
+        def inmemory(out):
+            with zipfile.ZipFile(folder + "/" + file_name) as z:
+                for name in z.namelist():
+                    with open(out + "/" + os.path.basename(name), "wb") as f:
+                        f.write(z.read(name))
+            return out + "/" + os.path.splitext(file_name)[0] + ".shp"
+
+        def streamed(out):
+            main.unzip(folder, file_name)
+            shutil.move(folder + "/" + os.path.splitext(file_name)[0], out + "/unzipped")
+            return out + "/unzipped/" + os.path.splitext(file_name)[0] + ".shp"
+
+        def vsizip(out):
+            return main.check_zipped_shapefile(folder + "/" + file_name)
+
+        for name, function in (("unzip in memory", inmemory), ("unzip in chunks", streamed), ("read in the zip", vsizip)):
+            out = tempfile.mkdtemp()
+            try:
+                tracemalloc.start()
+                start = time.perf_counter()
+                features = count(function(out))
+                total = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                report(name + ", " + file_name, total, total * 1000,
+                       "{:>7.1f} MB zip  {:>7d} features  peak {:>8.1f} MB".format(size, features, peak / 2 ** 20))
+            finally:
+                shutil.rmtree(out)
+
+
+def bench_ingest(url="http://www2.census.gov/geo/tiger/GENZ2016/shp/cb_2016_us_county_500k.zip",
+                 workers=(1, 2, 4, 8), chunksize=settings.INGEST_CHUNK):
+    """
+    Compare loading a shapefile with one COPY and with a pool of processes loading chunks of features
+    into an unlogged staging table, for several numbers of processes; features are reprojected to 3857
+    so that each process has some work besides reading
+    :param url: url of a zipped shapefile, downloaded once in the cache folder
+    :param workers: numbers of processes
+    :param chunksize: number of features loaded by a process at a time
+    :return: None
+    """
+    import multiprocessing
+    from psycopg2.extensions import AsIs
+    import geocache
+    import download
+    import shapeload
+    import main
+
+    folder = geocache.get_folder()
+    file_name = url.split("/")[-1]
+    download.fetch(download.get_urls(url), folder + "/" + file_name)
+    path = main.check_zipped_shapefile(folder + "/" + file_name)
+    table = settings.DEFAULT_SCHEMA + ".ingest_bench"
+    print("{} cpus".format(multiprocessing.cpu_count()))
+
+    try:
+        with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+            start = time.perf_counter()
+            features = shapeload.load(cur, path, table, 3857)
+            conn.commit()
+            single = time.perf_counter() - start
+        report("one COPY, " + file_name, single, single * 1000,
+               "{:>7d} features  {:>9.0f} features/s".format(features, features / single))
+
+        for w in workers:
+            start = time.perf_counter()
+            features = shapeload.parallel_load(path, table, 3857, w, chunksize)
+            total = time.perf_counter() - start
+            report("{} processes, ".format(w) + file_name, total, total * 1000,
+                   "{:>7d} features  {:>9.0f} features/s  x{:.2f}".format(features, features / total, single / total))
+    finally:
+        with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+            cur.execute("""DROP TABLE IF EXISTS %s""", (AsIs(table),))
+            cur.execute("""DROP TABLE IF EXISTS %s""", (AsIs(table + "_staging"),))
+            conn.commit()
+
+
+def bench_reproject(url="http://www2.census.gov/geo/tiger/GENZ2016/shp/cb_2016_us_county_500k.zip",
+                    epsgs=(4326, 3857), chunksize=settings.REPROJECT_CHUNK):
+    """
+    Compare reprojecting a shapefile feature by feature with reproject_vector and save_vector,
+    through /vsimem/, with the batched numpy reprojection writing the output file while it reads;
+    the COPY data of the loader is also made with both, without sending it to the database
+    :param url: url of a zipped shapefile, downloaded once in the cache folder
+    :param epsgs: output epsg codes
+    :param chunksize: number of features transformed together
+    :return: None
+    """
+    import shutil
+    import tempfile
+    from osgeo import ogr
+    from osgeo import osr
+    import geocache
+    import download
+    import shapeload
+    import reproject
+    import main
+
+    folder = geocache.get_folder()
+    file_name = url.split("/")[-1]
+    download.fetch(download.get_urls(url), folder + "/" + file_name)
+    path = main.check_zipped_shapefile(folder + "/" + file_name)
+    shapename = path.split("/")[-1]
+    features = shapeload.count_features(path)
+
+    def copy_data(epsg, batched):
+        dataset = ogr.Open(path, 0)
+        layer = dataset.GetLayer()
+        columns = shapeload.get_columns(layer)
+        features = iter(layer.GetNextFeature, None)
+        if batched:
+            features = reproject.iter_reprojected(features, reproject.get_layer_transformer(layer, epsg), chunksize)
+        else:
+            target = osr.SpatialReference()
+            target.ImportFromEPSG(epsg)
+            transform = osr.CoordinateTransformation(layer.GetSpatialRef(), target)
+
+            def transformed(features):
+                for feature in features:
+                    feature.GetGeometryRef().Transform(transform)
+                    yield feature
+            features = transformed(features)
+        for data in shapeload.iter_copy_data(features, columns, epsg):
+            pass
+        dataset = None
+
+    for epsg in epsgs:
+        out = tempfile.mkdtemp()
+        try:
+            def loop():
+                dataset = main.reproject_vector(path, epsg_to=epsg)
+                main.save_vector(dataset, out + "/loop_" + shapename)
+                dataset = None
+                ogr.GetDriverByName("ESRI Shapefile").DeleteDataSource("/vsimem/memory.shp")
+
+            def batched():
+                reproject.reproject_file(path, out + "/batched_" + shapename, epsg, chunksize=chunksize)
+
+            for name, function in (("reproject_vector + save_vector", loop), ("batched reproject_file", batched),
+                                   ("Transform + COPY data", lambda: copy_data(epsg, False)),
+                                   ("batched + COPY data", lambda: copy_data(epsg, True))):
+                start = time.perf_counter()
+                function()
+                total = time.perf_counter() - start
+                report(name + ", epsg:" + str(epsg), total, total * 1000,
+                       "{:>7d} features  {:>9.0f} features/s".format(features, features / total))
+        finally:
+            shutil.rmtree(out)
+
+
+BENCHMARKS = {
+    "connections": bench_connections,
+    "insert_scaling": bench_insert_scaling,
+    "containment": bench_containment,
+    "simplify": bench_simplify,
+    "geojson_cache": bench_geojson_cache,
+    "streaming": bench_streaming,
+    "render": bench_render,
+    "plot_points": bench_plot_points,
+    "unzip": bench_unzip,
+    "ingest": bench_ingest,
+    "reproject": bench_reproject,
+}
+
+
+if __name__ == '__main__':
+
+    names = sys.argv[1:] or sorted(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print("unknown benchmark " + name + ", possible values are " + " ".join(sorted(BENCHMARKS)))
+            continue
+        print("--- " + name + " ---")
+        BENCHMARKS[name]()
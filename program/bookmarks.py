@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name:        bookmarks.py
+# Purpose:     read the bookmarks visible in a map view, with the spatial index,
+#               streamed from a server side cursor or with keyset pagination on the bookmark id
+#
+# Author:      claudio piccinini
+#
+# Updated:     18/10/2026
+#-------------------------------------------------------------------------------
+
+import math
+
+from psycopg2.extensions import AsIs
+
+import utils
+import settings
+
+
+# web mercator latitude limit
+MAXLAT = 85.0511287798
+
+
+def view_bbox(center=settings.MAP_CENTER, zoom=settings.MAP_ZOOM, size=settings.MAP_SIZE):
+    """
+    Bounding box of a web map view
+    :param center: [latitude, longitude] of the map center
+    :param zoom: map zoom
+    :param size: (width, height) of the map in screen pixels
+    :return: (minlon, minlat, maxlon, maxlat) WGS84
+    """
+    # world size in pixels at this zoom, tiles are 256 pixels
+    world = 256 * 2 ** zoom
+    lat, lon = center
+    cx = (lon + 180) / 360 * world
+    cy = (1 - math.log(math.tan(math.radians(lat)) + 1 / math.cos(math.radians(lat))) / math.pi) / 2 * world
+
+    def tolonlat(px, py):
+        lon = px / world * 360 - 180
+        lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * py / world))))
+        return lon, lat
+
+    minlon, maxlat = tolonlat(cx - size[0] / 2, max(cy - size[1] / 2, 0))
+    maxlon, minlat = tolonlat(cx + size[0] / 2, min(cy + size[1] / 2, world))
+    return max(minlon, -180), max(minlat, -MAXLAT), min(maxlon, 180), min(maxlat, MAXLAT)
+
+
+def get_page(bbox, after=0, pagesize=settings.BOOKMARKS_PAGESIZE, tablename=settings.BOOKMARKS_TABLE_NAME):
+    """
+    Read one page of bookmarks inside a bounding box, ordered by id
+    :param bbox: (minlon, minlat, maxlon, maxlat) WGS84, if None read all the bookmarks
+    :param after: read the bookmarks with an id bigger than this
+    :param pagesize: maximum number of bookmarks
+    :param tablename: the bookmarks table
+    :return: list of (id, lon, lat, label, size)
+    """
+    with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+        if bbox is None:
+            cur.execute("""SELECT id, lon, lat, label, size FROM %s
+                            WHERE id > %s ORDER BY id LIMIT %s""",
+                        (AsIs(tablename), after, pagesize))
+        else:
+            cur.execute("""SELECT id, lon, lat, label, size FROM %s
+                            WHERE geom && ST_MakeEnvelope(%s, %s, %s, %s, 4326) AND id > %s
+                            ORDER BY id LIMIT %s""",
+                        (AsIs(tablename), bbox[0], bbox[1], bbox[2], bbox[3], after, pagesize))
+        return cur.fetchall()
+
+
+def stream_bookmarks(bbox=None, limit=None, itersize=settings.BOOKMARKS_ITERSIZE,
+                     tablename=settings.BOOKMARKS_TABLE_NAME):
+    """
+    Read the bookmarks inside a bounding box with a server side cursor, rows are received itersize at a time
+    and given to the caller as they arrive, the memory used does not depend on the number of bookmarks
+    The database connection is kept until the generator is exhausted or closed
+    :param bbox: (minlon, minlat, maxlon, maxlat) WGS84, if None read all the bookmarks
+    :param limit: maximum number of bookmarks, None for no limit
+    :param itersize: number of rows received from the server at a time
+    :param tablename: the bookmarks table
+    :return: a generator of (id, lon, lat, label, size)
+    """
+    with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn:
+        cur = conn.cursor(name="bookmarks_stream")
+        cur.itersize = itersize
+        try:
+            sql = """SELECT id, lon, lat, label, size FROM %s"""
+            params = [AsIs(tablename)]
+            if bbox is not None:
+                sql += """ WHERE geom && ST_MakeEnvelope(%s, %s, %s, %s, 4326)"""
+                params += list(bbox)
+            if limit is not None:
+                sql += """ LIMIT %s"""
+                params.append(limit)
+            cur.execute(sql, params)
+            for row in cur:
+                yield row
+        finally:
+            cur.close()
+
+
+def iter_bookmarks(bbox=None, zoom=None, limit=None, center=settings.MAP_CENTER, pagesize=settings.BOOKMARKS_PAGESIZE,
+                   stream=settings.BOOKMARKS_STREAM, itersize=settings.BOOKMARKS_ITERSIZE,
+                   tablename=settings.BOOKMARKS_TABLE_NAME):
+    """
+    Read the bookmarks inside a bounding box, with a server side cursor or one page at a time;
+    with pages the database connection is given back to the pool between pages and the bookmarks are ordered by id
+    :param bbox: (minlon, minlat, maxlon, maxlat) WGS84; if None and zoom is given use the view of a map with this zoom
+     and center, if both are None read all the bookmarks
+    :param zoom: map zoom
+    :param limit: maximum number of bookmarks, None for no limit
+    :param center: [latitude, longitude] of the map center, used with zoom
+    :param pagesize: number of bookmarks read from the database at a time when reading pages
+    :param stream: if True use a server side cursor (stream_bookmarks) otherwise read pages
+    :param itersize: number of bookmarks received from the server side cursor at a time
+    :param tablename: the bookmarks table
+    :return: a generator of (id, lon, lat, label, size)
+    """
+    if bbox is None and zoom is not None:
+        bbox = view_bbox(center, zoom)
+
+    if stream:
+        for row in stream_bookmarks(bbox, limit, itersize, tablename):
+            yield row
+        return
+
+    after = 0
+    count = 0
+    while limit is None or count < limit:
+        size = pagesize if limit is None else min(pagesize, limit - count)
+        page = get_page(bbox, after, size, tablename)
+        for row in page:
+            yield row
+        count += len(page)
+        if len(page) < size:
+            break
+        after = page[-1][0]
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name:        bulkimport.py
+# Purpose:     load many bookmarks at once from a csv or geojson file
+#               run as "python bulkimport.py points.csv [rejected.csv]"
+#
+# Author:      claudio piccinini
+#
+# Updated:     18/10/2026
+#-------------------------------------------------------------------------------
+import os
+import io
+import sys
+import csv
+import json
+
+import numpy as np
+
+import utils
+import settings
+import containment
+
+
+# width of the byte strings used to crop the coordinates
+COORD_WIDTH = 32
+# maximum label length, same as the bookmarks table
+LABEL_LENGTH = 15
+
+
+def iter_csv(path):
+    """
+    Read a csv file with lon,lat,label columns (x,y are accepted for lon,lat)
+    If the first row is not a header the columns are taken in the order lon,lat,label
+    :param path: path to the csv file
+    :return: a generator of (lon, lat, label) string tuples, rows without the lon and lat columns give empty
+     strings, they are rejected as not valid coordinates
+    """
+
+    def get(row, i):
+        return row[i] if i is not None and i < len(row) else ""
+
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        names = [h.strip().lower() for h in header]
+        if ("lon" in names or "x" in names) and ("lat" in names or "y" in names):
+            ix = names.index("lon") if "lon" in names else names.index("x")
+            iy = names.index("lat") if "lat" in names else names.index("y")
+            il = names.index("label") if "label" in names else None
+        else:
+            ix, iy, il = 0, 1, 2 if len(header) > 2 else None
+            yield get(header, ix).strip(), get(header, iy).strip(), get(header, il)
+
+        for row in reader:
+            if not row:
+                continue
+            yield get(row, ix).strip(), get(row, iy).strip(), get(row, il)
+
+
+def iter_geojson(path, buffersize=1 << 20):
+    """
+    Read the point features of a geojson FeatureCollection one at a time, without loading the whole file
+    Numbers are kept as text so that the decimal digits can be counted as upload_point does
+    The label is taken from the "label" property, or "name" if there is no label
+    :param path: path to the geojson file
+    :param buffersize: number of characters read at a time
+    :return: a generator of (lon, lat, label) string tuples
+    """
+    decoder = json.JSONDecoder(parse_float=str, parse_int=str)
+
+    with open(path, encoding='utf-8') as f:
+        buffer = ""
+        # move to the start of the features array
+        while True:
+            start = buffer.find('"features"')
+            if start >= 0:
+                bracket = buffer.find('[', start)
+                if bracket >= 0:
+                    buffer = buffer[bracket + 1:]
+                    break
+            chunk = f.read(buffersize)
+            if not chunk:
+                raise Exception("the geojson file has no features")
+            buffer += chunk
+
+        eof = False
+        pos = 0
+        while True:
+            # skip separators between features
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if buffer.startswith(']', pos):
+                return
+            try:
+                feature, pos = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                if eof:
+                    raise Exception("the geojson file is truncated or malformed")
+                chunk = f.read(buffersize)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+
+            geometry = feature.get("geometry") or {}
+            if geometry.get("type") != "Point":
+                continue
+            coords = geometry.get("coordinates") or []
+            if len(coords) < 2:
+                continue
+            properties = feature.get("properties") or {}
+            label = properties.get("label", properties.get("name", ""))
+            yield str(coords[0]), str(coords[1]), "" if label is None else str(label)
+
+
+def iter_chunks(rows, size):
+    """
+    Group rows in lists
+    :param rows: an iterable
+    :param size: number of rows in each list
+    :return: a generator of lists
+    """
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def crop_coordinates(x, y):
+    """
+    Vectorized version of the upload_point rules: crop the coordinates to 4 decimal digits and define the marker size
+    based on the bigger number of decimal digits (0 digits is size 5, 4 digits is size 1)
+    :param x: numpy array of longitude strings
+    :param y: numpy array of latitude strings
+    :return: a tuple with (cropped x, cropped y, size, valid, lon, lat) numpy arrays, valid is False for the rows
+     to reject, lon and lat are the cropped coordinates as floats
+    """
+
+    def crop(values):
+        # non ascii characters become '?' and make the row not valid
+        b = np.char.encode(np.char.strip(values), 'ascii', 'replace').astype('S' + str(COORD_WIDTH))
+        # characters as a 2d array of bytes, one row per number
+        chars = b.view(np.uint8).reshape(len(b), COORD_WIDTH)
+        length = np.char.str_len(b)
+        dot = np.char.find(b, b'.')
+        digits = np.where(dot >= 0, length - dot - 1, 0)
+        # blank every character after the 4th decimal digit
+        limit = np.where(dot >= 0, dot + 5, COORD_WIDTH)
+        chars[np.arange(COORD_WIDTH) >= limit[:, None]] = 0
+        return chars.view('S' + str(COORD_WIDTH)).ravel(), np.minimum(digits, 4), np.char.find(b, b',') >= 0
+
+    cx, lx, commax = crop(np.asarray(x, dtype=str))
+    cy, ly, commay = crop(np.asarray(y, dtype=str))
+    size = 5 - np.maximum(lx, ly)
+
+    # rows that are not numbers, or use ',' as decimal separator, are not valid
+    valid = ~(commax | commay)
+    lon = np.full(len(cx), np.nan)
+    lat = np.full(len(cy), np.nan)
+    try:
+        lon[valid] = cx[valid].astype(float)
+        lat[valid] = cy[valid].astype(float)
+    except ValueError:
+        # some values are not numbers, find them one by one
+        for i in np.flatnonzero(valid):
+            try:
+                lon[i] = float(cx[i])
+                lat[i] = float(cy[i])
+            except ValueError:
+                valid[i] = False
+    valid &= np.isfinite(lon) & np.isfinite(lat)
+
+    return np.char.decode(cx, 'ascii'), np.char.decode(cy, 'ascii'), size, valid, lon, lat
+
+
+def copy_escape(value):
+    """ escape a string for the postgresql COPY text format """
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_bookmarks(cur, x, y, labels, size, states):
+    """
+    Load bookmarks into the bookmarks table with COPY
+    :param cur: a database cursor
+    :param x: longitude strings
+    :param y: latitude strings
+    :param labels: label strings
+    :param size: marker sizes
+    :param states: state names
+    :return: None
+    """
+    buffer = io.StringIO()
+    for xi, yi, li, si, st in zip(x, y, labels, size, states):
+        buffer.write(yi + '\t' + xi + '\t' + copy_escape(li) + '\t' + str(si) + '\t' + copy_escape(st) +
+                     '\tSRID=4326;POINT(' + xi + ' ' + yi + ')\n')
+    buffer.seek(0)
+    cur.copy_expert("COPY " + settings.BOOKMARKS_TABLE_NAME + " (lat, lon, label, size, state, geom) FROM STDIN",
+                    buffer)
+
+
+def import_file(path, reject_path=None, chunksize=settings.BULK_CHUNK):
+    """
+    Load the bookmarks in a csv or geojson file, rows are read, checked and loaded in chunks
+    Rows outside USA or with invalid values are written to a csv reject file with a reason column
+    The whole file is loaded in one transaction
+    :param path: path to a .csv, .geojson or .json file
+    :param reject_path: path to the reject file, if None use the input name with a "_rejected.csv" suffix
+    :param chunksize: number of rows checked and copied at a time
+    :return: a tuple with (number of rows loaded, number of rows rejected, path to the reject file)
+    """
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        rows = iter_csv(path)
+    elif ext in (".geojson", ".json"):
+        rows = iter_geojson(path)
+    else:
+        raise Exception("file should be .csv or .geojson")
+
+    if not reject_path:
+        reject_path = os.path.splitext(path)[0] + "_rejected.csv"
+
+    loaded = 0
+    rejected = 0
+
+    try:
+        with open(reject_path, 'w', newline='', encoding='utf-8') as rf, \
+                utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+            rejects = csv.writer(rf)
+            rejects.writerow(["lon", "lat", "label", "reason"])
+
+            for chunk in iter_chunks(rows, chunksize):
+                rawx, rawy, labels = zip(*chunk)
+                labels = np.asarray(labels, dtype=object)
+                x, y, size, valid, lon, lat = crop_coordinates(rawx, rawy)
+
+                reason = np.full(len(chunk), "", dtype=object)
+                reason[~valid] = "not a valid coordinate"
+                toolong = np.fromiter((len(l) > LABEL_LENGTH for l in labels), dtype=bool, count=len(labels))
+                reason[valid & toolong] = "label longer than " + str(LABEL_LENGTH) + " characters"
+                valid &= ~toolong
+
+                candidates = np.flatnonzero(valid)
+                # check all the points at once, with the in memory index or a single set based query
+                states = containment.locate_many(cur, lon[candidates], lat[candidates])
+                inside = states != None
+                reason[candidates[~inside]] = "the point is not inside USA"
+                accepted = candidates[inside]
+
+                copy_bookmarks(cur, x[accepted], y[accepted], labels[accepted], size[accepted], states[inside])
+                loaded += len(accepted)
+
+                for i in np.flatnonzero(reason != ""):
+                    rejects.writerow([rawx[i], rawy[i], labels[i], reason[i]])
+                    rejected += 1
+
+            conn.commit()
+
+    except Exception as e:
+        raise Exception(e)
+
+    else:
+        return loaded, rejected, reject_path
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) < 2:
+        print("usage: python bulkimport.py points.csv|points.geojson [rejected.csv]")
+        sys.exit(1)
+
+    print("Importing " + sys.argv[1] + "...")
+    loaded, rejected, reject_path = import_file(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    print(str(loaded) + " bookmarks loaded, " + str(rejected) + " rows rejected")
+    if rejected:
+        print("rejected rows are listed in " + reject_path)
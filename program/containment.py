@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name:        containment.py
+# Purpose:     point in USA check, the states are loaded once from the database
+#               and indexed with a regular grid, so that points can be checked without a database query;
+#               PostGIS is used with a table of subdivided states if the in memory index is not available;
+#               the tables derived from the states (subdivided and simplified) are built here
+#
+# Author:      claudio piccinini
+#
+# Updated:     18/10/2026
+#-------------------------------------------------------------------------------
+
+import numpy as np
+import shapely
+from shapely.wkb import loads
+from shapely.prepared import prep
+from shapely.geometry import Point
+from psycopg2.extensions import AsIs
+
+import utils
+import settings
+
+# vectorized point in polygon and in place preparation of a geometry, available with shapely 2
+contains_xy = getattr(shapely, "contains_xy", None)
+prepare = getattr(shapely, "prepare", None)
+
+# global variable to store the states index, False if it cannot be loaded
+INDEX = None
+
+
+class StatesIndex(object):
+    """
+    Polygons of the states indexed with a regular grid of cells
+    Each cell stores the polygons whose bounding box touches it, points falling in an empty cell
+    or outside the bounding box of the whole USA are rejected without any geometry test
+    """
+
+    def __init__(self, geometries, names, cellsize=settings.CONTAINMENT_CELLSIZE):
+        """
+        :param geometries: list of shapely polygons or multipolygons in WGS84
+        :param names: list with the name of each geometry
+        :param cellsize: grid cell size in degrees
+        """
+
+        self.names = list(names)
+        self.cellsize = float(cellsize)
+
+        # split multipolygons, a part has its own bounding box and remembers its state
+        self.parts = []
+        owners = []
+        for i, geom in enumerate(geometries):
+            for polygon in getattr(geom, "geoms", [geom]):
+                if polygon.is_empty:
+                    continue
+                self.parts.append(polygon)
+                owners.append(i)
+        if not self.parts:
+            raise Exception("there are no states to index")
+
+        self.owners = np.asarray(owners)
+        self.prepared = [prep(p) for p in self.parts]
+        if prepare is not None:
+            # contains_xy uses the prepared geometry of the part itself
+            for p in self.parts:
+                prepare(p)
+        self.bounds = np.asarray([p.bounds for p in self.parts])  # minx, miny, maxx, maxy
+
+        # bounding box of the whole USA
+        self.minx, self.miny = self.bounds[:, 0].min(), self.bounds[:, 1].min()
+        self.maxx, self.maxy = self.bounds[:, 2].max(), self.bounds[:, 3].max()
+
+        # grid, cells are numbered row by row from the lower left corner
+        self.ncols = int(np.floor((self.maxx - self.minx) / self.cellsize)) + 1
+        self.nrows = int(np.floor((self.maxy - self.miny) / self.cellsize)) + 1
+        self.cells = {}
+        for i, (minx, miny, maxx, maxy) in enumerate(self.bounds):
+            c0, r0 = self._cell(minx, miny)
+            c1, r1 = self._cell(maxx, maxy)
+            for r in range(r0, r1 + 1):
+                for c in range(c0, c1 + 1):
+                    self.cells.setdefault(r * self.ncols + c, []).append(i)
+
+    @classmethod
+    def from_database(cls, cellsize=settings.CONTAINMENT_CELLSIZE):
+        """
+        Load the states table
+        :param cellsize: grid cell size in degrees
+        :return: a StatesIndex
+        """
+        with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+            cur.execute("""SELECT ST_AsBinary(geom), name FROM %s WHERE geom IS NOT NULL""",
+                        (AsIs(settings.STATES_TABLE_NAME),))
+            rows = cur.fetchall()
+        return cls([loads(bytes(r[0])) for r in rows], [r[1] for r in rows], cellsize)
+
+    def _cell(self, x, y):
+        """ return the (column, row) of the cell containing a point """
+        return int((x - self.minx) // self.cellsize), int((y - self.miny) // self.cellsize)
+
+    def locate(self, x, y):
+        """
+        Find the state containing a point
+        :param x: longitude WGS84
+        :param y: latitude WGS84
+        :return: the state name, None if the point is not inside USA
+        """
+        if not (self.minx <= x <= self.maxx and self.miny <= y <= self.maxy):
+            return None
+        c, r = self._cell(x, y)
+        candidates = self.cells.get(r * self.ncols + c)
+        if not candidates:
+            return None
+        point = Point(x, y)
+        for i in candidates:
+            minx, miny, maxx, maxy = self.bounds[i]
+            if minx <= x <= maxx and miny <= y <= maxy and self.prepared[i].contains(point):
+                return self.names[self.owners[i]]
+        return None
+
+    def contains(self, x, y):
+        """
+        Check a point is inside USA
+        :param x: longitude WGS84
+        :param y: latitude WGS84
+        :return: True if the point is inside a state
+        """
+        return self.locate(x, y) is not None
+
+    def locate_many(self, x, y):
+        """
+        Find the state containing each point
+        :param x: numpy array of longitudes WGS84
+        :param y: numpy array of latitudes WGS84
+        :return: numpy array with the index in self.names of the state containing each point, -1 for points outside USA
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        result = np.full(len(x), -1, dtype=int)
+
+        inside = (x >= self.minx) & (x <= self.maxx) & (y >= self.miny) & (y <= self.maxy)
+        points = np.flatnonzero(inside)
+        if not len(points):
+            return result
+
+        # group the points by grid cell and test each group against the polygons of its cell
+        cols = ((x[points] - self.minx) // self.cellsize).astype(int)
+        rows = ((y[points] - self.miny) // self.cellsize).astype(int)
+        cellids, groups = np.unique(rows * self.ncols + cols, return_inverse=True)
+        order = np.argsort(groups, kind="mergesort")
+        splits = np.searchsorted(groups[order], np.arange(1, len(cellids)))
+
+        for cellid, members in zip(cellids, np.split(points[order], splits)):
+            for i in self.cells.get(int(cellid), ()):
+                todo = members[result[members] < 0]
+                if not len(todo):
+                    break
+                minx, miny, maxx, maxy = self.bounds[i]
+                px, py = x[todo], y[todo]
+                todo = todo[(px >= minx) & (px <= maxx) & (py >= miny) & (py <= maxy)]
+                if not len(todo):
+                    continue
+                if contains_xy is not None:
+                    hit = contains_xy(self.parts[i], x[todo], y[todo])
+                else:
+                    hit = np.fromiter((self.prepared[i].contains(Point(a, b)) for a, b in zip(x[todo], y[todo])),
+                                      dtype=bool, count=len(todo))
+                result[todo[hit]] = self.owners[i]
+
+        return result
+
+    def contains_many(self, x, y):
+        """
+        Check many points are inside USA
+        :param x: numpy array of longitudes WGS84
+        :param y: numpy array of latitudes WGS84
+        :return: numpy boolean array, True for the points inside a state
+        """
+        return self.locate_many(x, y) >= 0
+
+
+def get_index():
+    """
+    Return the in memory states index, it is loaded from the database on first use
+    :return: a StatesIndex, None if the index is disabled or cannot be loaded and PostGIS must be used
+    """
+    global INDEX
+    if INDEX is None:
+        if not settings.CONTAINMENT_IN_MEMORY:
+            return None
+        try:
+            INDEX = StatesIndex.from_database()
+        except Exception as e:
+            print("in memory point check not available, PostGIS will be used: " + str(e))
+            INDEX = False
+    return INDEX or None
+
+
+def invalidate():
+    """
+    Forget the states index, it will be loaded again on next use; call it when the states table changes
+    :return: None
+    """
+    global INDEX
+    INDEX = None
+
+
+def build_subdivided(cur):
+    """
+    Create (or replace) the table with the states split in small pieces and its spatial index,
+    a point check against small pieces reads few vertices and makes good use of the index
+    :param cur: a database cursor, the caller commits
+    :return: None
+    """
+    cur.execute("""DROP TABLE IF EXISTS %s""", (AsIs(settings.STATES_SUBDIVIDED_TABLE_NAME),))
+    cur.execute("""CREATE TABLE %s AS
+                    SELECT gid, name, ST_Subdivide(geom, %s) AS geom FROM %s WHERE geom IS NOT NULL""",
+                (AsIs(settings.STATES_SUBDIVIDED_TABLE_NAME), settings.SUBDIVIDE_VERTICES,
+                 AsIs(settings.STATES_TABLE_NAME)))
+    cur.execute("""CREATE INDEX idx_%s_geom ON %s USING GIST(geom)""",
+                (AsIs(settings.STATES_SUBDIVIDED), AsIs(settings.STATES_SUBDIVIDED_TABLE_NAME)))
+    cur.execute("""ANALYZE %s""", (AsIs(settings.STATES_SUBDIVIDED_TABLE_NAME),))
+
+
+def build_simplified(cur):
+    """
+    Create (or replace) the table with the states geojson simplified for each level in settings.SIMPLIFY_LEVELS,
+    geometries are simplified with ST_SimplifyPreserveTopology and coordinates are rounded with ST_AsGeoJSON
+    :param cur: a database cursor, the caller commits
+    :return: None
+    """
+    cur.execute("""DROP TABLE IF EXISTS %s""", (AsIs(settings.STATES_GEOJSON_TABLE_NAME),))
+    cur.execute("""CREATE TABLE %s (level smallint PRIMARY KEY, minzoom smallint, tolerance float8, geojson json)""",
+                (AsIs(settings.STATES_GEOJSON_TABLE_NAME),))
+    for level, (minzoom, tolerance, digits) in enumerate(settings.SIMPLIFY_LEVELS):
+        cur.execute("""INSERT INTO %s SELECT %s, %s, %s, row_to_json(fc) FROM
+                          ( SELECT 'FeatureCollection' As type, array_to_json(array_agg(f)) As features
+                          FROM (SELECT 'Feature' As type ,
+                                       ST_AsGeoJSON(CASE WHEN %s > 0 THEN ST_SimplifyPreserveTopology(lg.geom, %s)
+                                                    ELSE lg.geom END, %s)::json As geometry,
+                                       row_to_json(lp) As properties
+                           FROM %s As lg  INNER JOIN (SELECT gid,name FROM %s) As lp
+                               ON lg.gid = lp.gid ) As f)  As fc;""",
+                    (AsIs(settings.STATES_GEOJSON_TABLE_NAME), level, minzoom, tolerance, tolerance, tolerance, digits,
+                     AsIs(settings.STATES_TABLE_NAME), AsIs(settings.STATES_TABLE_NAME)))
+
+
+def locate_sql(cur, x, y):
+    """
+    Find the state containing a point with PostGIS, the first subdivided piece found with the spatial index is enough
+    :param cur: a database cursor
+    :param x: longitude WGS84
+    :param y: latitude WGS84
+    :return: the state name, None if the point is not inside USA
+    """
+    utils.pgprepare(cur, "locate_state",
+                    """SELECT name FROM """ + settings.STATES_SUBDIVIDED_TABLE_NAME + """
+                        WHERE geom && ST_SetSRID(ST_MakePoint($1, $2), 4326)
+                          AND ST_Intersects(geom, ST_SetSRID(ST_MakePoint($1, $2), 4326)) LIMIT 1""",
+                    ["float8", "float8"])
+    cur.execute("""EXECUTE locate_state (%s, %s)""", (x, y))
+    result = cur.fetchone()
+    return result[0] if result else None
+
+
+def locate_many_sql(cur, x, y):
+    """
+    Find the state containing each point with a single set based query
+    :param cur: a database cursor
+    :param x: numpy array of longitudes WGS84
+    :param y: numpy array of latitudes WGS84
+    :return: numpy object array with the state name of each point, None for points outside USA
+    """
+    names = np.full(len(x), None, dtype=object)
+    if not len(x):
+        return names
+    cur.execute("""SELECT p.i - 1, s.name FROM unnest(%s::float8[], %s::float8[]) WITH ORDINALITY AS p(lon, lat, i)
+                    CROSS JOIN LATERAL (SELECT name FROM %s
+                                         WHERE geom && ST_SetSRID(ST_MakePoint(p.lon, p.lat), 4326)
+                                           AND ST_Intersects(geom, ST_SetSRID(ST_MakePoint(p.lon, p.lat), 4326))
+                                         LIMIT 1) AS s""",
+                (np.asarray(x, dtype=float).tolist(), np.asarray(y, dtype=float).tolist(),
+                 AsIs(settings.STATES_SUBDIVIDED_TABLE_NAME)))
+    for i, name in cur.fetchall():
+        names[i] = name
+    return names
+
+
+def locate(cur, x, y):
+    """
+    Find the state containing a point, with the in memory index or with PostGIS
+    :param cur: a database cursor, used only if the index is not available
+    :param x: longitude WGS84
+    :param y: latitude WGS84
+    :return: the state name, None if the point is not inside USA
+    """
+    index = get_index()
+    if index:
+        return index.locate(x, y)
+    return locate_sql(cur, x, y)
+
+
+def locate_many(cur, x, y):
+    """
+    Find the state containing each point, with the in memory index or with PostGIS
+    :param cur: a database cursor, used only if the index is not available
+    :param x: numpy array of longitudes WGS84
+    :param y: numpy array of latitudes WGS84
+    :return: numpy object array with the state name of each point, None for points outside USA
+    """
+    index = get_index()
+    if index:
+        found = index.locate_many(x, y)
+        names = np.full(len(found), None, dtype=object)
+        names[found >= 0] = np.asarray(index.names, dtype=object)[found[found >= 0]]
+        return names
+    return locate_many_sql(cur, x, y)
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name:        download.py
+# Purpose:     download a file once and keep it, the next downloads send conditional requests (ETag, Last-Modified)
+#               and partial files are resumed with Range requests; files are checked with a sha256 checksum
+#               and several mirrors can be tried, file:// urls are supported to work offline
+#
+# Author:      claudio piccinini
+#
+# Updated:     18/10/2026
+#-------------------------------------------------------------------------------
+
+import os
+import json
+import socket
+import hashlib
+import http.client
+import urllib.error
+import urllib.request
+
+import settings
+
+
+def get_meta_path(path):
+    """ return the path of the file storing the download information of a file """
+    return path + ".meta.json"
+
+
+def load_meta(path):
+    """
+    Read the download information of a file
+    :param path: the downloaded file
+    :return: a dictionary, empty if not available
+    """
+    try:
+        with open(get_meta_path(path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def save_meta(path, meta):
+    """
+    Write the download information of a file
+    :param path: the downloaded file
+    :param meta: a dictionary with url, etag, last_modified, length, complete, sha256
+    :return: None
+    """
+    temp = get_meta_path(path) + ".tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(temp, get_meta_path(path))
+
+
+def sha256(path):
+    """
+    Checksum of a file, read a chunk at a time
+    :param path: the file
+    :return: the hex digest
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(settings.DOWNLOAD_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def fetch_once(url, path):
+    """
+    Download a url to a file with one request
+    A complete file downloaded before from the same url is checked with a conditional request,
+    a partial file is resumed with a range request; the data is written to path + ".part" and renamed at the end
+    :param url: the url, http, https or file
+    :param path: the output file
+    :return: "not modified", "downloaded" or "resumed"
+    """
+    part = path + ".part"
+    meta = load_meta(path)
+    validator = meta.get("etag") or meta.get("last_modified")
+    same = meta.get("url") == url
+
+    headers = {}
+    offset = 0
+    if same and not meta.get("complete") and validator and os.path.exists(part):
+        # resume, If-Range makes the server send the whole file if it changed
+        offset = os.path.getsize(part)
+        headers["Range"] = "bytes=" + str(offset) + "-"
+        headers["If-Range"] = validator
+    elif same and meta.get("complete") and os.path.exists(path):
+        if meta.get("etag"): headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"): headers["If-Modified-Since"] = meta["last_modified"]
+
+    try:
+        response = urllib.request.urlopen(urllib.request.Request(url, headers=headers),
+                                          timeout=settings.DOWNLOAD_TIMEOUT)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return "not modified"
+        if e.code == 416:
+            # the partial file is not valid for the server, start again
+            os.remove(part)
+        raise
+
+    with response:
+        etag = response.headers.get("ETag")
+        modified = response.headers.get("Last-Modified")
+        length = response.headers.get("Content-Length")
+        status = response.getcode()  # None for file:// urls
+
+        # servers that do not answer conditional requests, and file:// urls, send the whole file:
+        # the file did not change if the validators did not change
+        if "If-Modified-Since" in headers or "If-None-Match" in headers:
+            if (etag, modified, length) == (meta.get("etag"), meta.get("last_modified"), str(meta.get("length"))) \
+                    and (etag or modified):
+                return "not modified"
+
+        if status == 206:
+            mode = "ab"
+            total = offset + int(length) if length else None
+        else:
+            mode, offset = "wb", 0
+            total = int(length) if length else None
+
+        save_meta(path, {"url": url, "etag": etag, "last_modified": modified, "length": total, "complete": False})
+        with open(part, mode) as f:
+            while True:
+                chunk = response.read(settings.DOWNLOAD_CHUNK)
+                if not chunk:
+                    break
+                f.write(chunk)
+
+    size = os.path.getsize(part)
+    if total is not None and size != total:
+        raise Exception("incomplete download of " + url + ": " + str(size) + " of " + str(total) + " bytes")
+
+    os.replace(part, path)
+    save_meta(path, {"url": url, "etag": etag, "last_modified": modified, "length": size, "complete": True,
+                     "sha256": sha256(path)})
+    return "resumed" if offset else "downloaded"
+
+
+def fetch(urls, path, checksum=None, retries=settings.DOWNLOAD_RETRIES):
+    """
+    Download a file from the first url that works, a broken download is resumed up to retries times
+    :param urls: list of urls of the same file, tried in order
+    :param path: the output file
+    :param checksum: the expected sha256 of the file, if None the file is not checked
+    :param retries: number of times a broken download is resumed from the same url
+    :return: (url used, "not modified", "downloaded" or "resumed")
+    """
+    errors = []
+    for url in urls:
+        for attempt in range(retries + 1):
+            try:
+                status = fetch_once(url, path)
+            except (urllib.error.URLError, socket.timeout, ConnectionError, http.client.HTTPException) as e:
+                errors.append(url + ": " + str(e))
+                if isinstance(e, urllib.error.HTTPError) and e.code != 416:
+                    break  # the server answered, try the next mirror
+                continue
+            except Exception as e:
+                errors.append(url + ": " + str(e))
+                continue
+
+            meta = load_meta(path)
+            if status == "not modified" and os.path.getsize(path) != meta.get("length"):
+                # the local file was changed, download it again
+                os.remove(get_meta_path(path))
+                continue
+            if checksum and meta.get("sha256") != checksum.lower():
+                errors.append(url + ": checksum does not match")
+                os.remove(path)
+                os.remove(get_meta_path(path))
+                break
+            return url, status
+
+    raise Exception("download failed\n" + "\n".join(errors))
+
+
+def get_urls(url):
+    """
+    Return the url followed by the same file name on each mirror in settings.DOWNLOAD_MIRRORS
+    :param url: the url
+    :return: list of urls
+    """
+    name = url.rstrip("/").split("/")[-1]
+    return [url] + [mirror.rstrip("/") + "/" + name for mirror in settings.DOWNLOAD_MIRRORS]
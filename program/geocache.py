@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name:        geocache.py
+# Purpose:     disk cache for data and numpy arrays built from a database table,
+#               files are versioned with a fingerprint of the table and are rebuilt only when the table changes
+#
+# Author:      claudio piccinini
+#
+# Updated:     18/10/2026
+#-------------------------------------------------------------------------------
+
+import os
+import gzip
+import json
+import glob
+
+import numpy as np
+from psycopg2.extensions import AsIs
+
+import settings
+
+
+def get_folder():
+    """
+    Return the cache folder, it is created if not existing
+    :return: path to the folder
+    """
+    folder = settings.CACHE_FOLDER
+    if not folder:
+        folder = os.path.dirname(os.path.abspath(__file__)) + "/cache"
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    return folder
+
+
+def fingerprint(cur, tablename=settings.STATES_TABLE_NAME, key="gid", column="name"):
+    """
+    Fingerprint of a table made of row count, max key and a checksum of keys, one attribute and geometries
+    :param cur: a database cursor
+    :param tablename: the table name with the schema
+    :param key: the table primary key
+    :param column: the attribute included in the checksum
+    :return: a string
+    """
+    cur.execute("""SELECT count(*), max(t.%s),
+                          md5(string_agg(md5(t.%s::text || coalesce(t.%s::text, '') || ST_AsBinary(t.geom)::text),
+                                         '' ORDER BY t.%s))
+                   FROM %s AS t""", (AsIs(key), AsIs(key), AsIs(column), AsIs(key), AsIs(tablename)))
+    count, maxkey, checksum = cur.fetchone()
+    return str(count) + "-" + str(maxkey) + "-" + str(checksum)[:16]
+
+
+def get_path(name, version, extension=".json.gz"):
+    """ return the path of a cache file """
+    return get_folder() + "/" + name + "-" + version + extension
+
+
+def load(name, version):
+    """
+    Read data from the cache
+    :param name: the cached data name
+    :param version: the table fingerprint the data must be built from
+    :return: the data, None if not in the cache
+    """
+    path = get_path(name, version)
+    if not os.path.exists(path):
+        return None
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        # damaged file, it will be written again
+        os.remove(path)
+        return None
+
+
+def save(name, version, data):
+    """
+    Write data to the cache, replacing the versions of the same data built from older tables
+    :param name: the cached data name
+    :param version: the table fingerprint the data was built from
+    :param data: a json serializable object
+    :return: the path to the cache file
+    """
+    invalidate(name)
+    path = get_path(name, version)
+    temp = path + ".tmp"
+    with gzip.open(temp, "wt", encoding="utf-8", compresslevel=settings.CACHE_COMPRESSION) as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(temp, path)  # readers never see a partial file
+    return path
+
+
+def load_arrays(name, version):
+    """
+    Read numpy arrays from the cache
+    :param name: the cached data name
+    :param version: the table fingerprint the arrays must be built from
+    :return: a dictionary of arrays, None if not in the cache
+    """
+    path = get_path(name, version, ".npz")
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as f:
+            return dict(f)
+    except Exception:
+        # damaged file, it will be written again
+        os.remove(path)
+        return None
+
+
+def save_arrays(name, version, **arrays):
+    """
+    Write numpy arrays to the cache, uncompressed so that they are read as fast as possible
+    :param name: the cached data name
+    :param version: the table fingerprint the arrays were built from
+    :param arrays: the arrays, as keyword arguments
+    :return: the path to the cache file
+    """
+    invalidate(name)
+    path = get_path(name, version, ".npz")
+    temp = path + ".tmp"
+    with open(temp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(temp, path)
+    return path
+
+
+def invalidate(name=None):
+    """
+    Delete cached data
+    :param name: the cached data name, if None delete all the cache
+    :return: None
+    """
+    for extension in (".json.gz", ".npz"):
+        pattern = (glob.escape(name) if name else "*") + "-*" + extension
+        for path in glob.glob(get_folder() + "/" + pattern):
+            os.remove(path)
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name:        imagewriter.py
+# Purpose:     encode and write the browser screenshots in background threads,
+#               the caller only puts the png bytes in a bounded queue and goes on
+#
+# Author:      claudio piccinini
+#
+# Updated:     18/10/2026
+#-------------------------------------------------------------------------------
+
+import io
+import os
+import queue
+import atexit
+import threading
+
+from PIL import Image
+
+import settings
+
+
+# file extension of each output format
+EXTENSIONS = {"png": ".png", "jpeg": ".jpeg", "webp": ".webp"}
+
+# global variable to store the writer
+WRITER = None
+WRITER_LOCK = threading.Lock()
+
+
+def get_name(outname, format=settings.IMAGE_FORMAT):
+    """
+    Return the image name with the extension of the output format
+    :param outname: the image name, for example "states.jpeg"
+    :param format: "png", "jpeg" or "webp"
+    :return: the image name
+    """
+    if format not in EXTENSIONS:
+        raise Exception("image format should be one of " + ", ".join(sorted(EXTENSIONS)))
+    return os.path.splitext(outname)[0] + EXTENSIONS[format]
+
+
+def encode(png, path, format=settings.IMAGE_FORMAT, quality=settings.IMAGE_QUALITY, dpi=settings.IMAGE_DPI):
+    """
+    Write a png screenshot to disk in the output format, png is written as it is without decoding it
+    :param png: the png bytes
+    :param path: the output path
+    :param format: "png", "jpeg" or "webp"
+    :param quality: jpeg and webp quality, 1 to 100
+    :param dpi: resolution written in the jpeg files, png files are written as taken
+    :return: the path
+    """
+    temp = path + ".tmp"
+    if format == "png":
+        with open(temp, "wb") as f:
+            f.write(png)
+    else:
+        img = Image.open(io.BytesIO(png))
+        if format == "jpeg":
+            img.convert(mode="RGB").save(temp, format="JPEG", quality=quality, dpi=(dpi, dpi))
+        else:
+            img.save(temp, format="WEBP", quality=quality, method=settings.IMAGE_WEBP_METHOD)
+    os.replace(temp, path)  # a partial image is never seen with the final name
+    return path
+
+
+class ImageWriter(object):
+    """ Threads encoding and writing images taken from a bounded queue """
+
+    def __init__(self, workers=settings.IMAGE_WRITERS, queuesize=settings.IMAGE_QUEUE_SIZE):
+        """
+        :param workers: number of writer threads
+        :param queuesize: maximum number of images waiting, put() blocks when the queue is full
+        """
+        self._queue = queue.Queue(maxsize=queuesize)
+        self._errors = []
+        self._lock = threading.Lock()
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._run, name="imagewriter-" + str(i))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            args = self._queue.get()
+            try:
+                encode(*args)
+            except Exception as e:
+                with self._lock:
+                    self._errors.append(args[1] + ": " + str(e))
+            finally:
+                self._queue.task_done()
+
+    def put(self, png, path, format=settings.IMAGE_FORMAT, quality=settings.IMAGE_QUALITY, dpi=settings.IMAGE_DPI):
+        """
+        Queue an image, wait only if the queue is full
+        :param png: the png bytes
+        :param path: the output path
+        :param format: "png", "jpeg" or "webp"
+        :param quality: jpeg and webp quality
+        :param dpi: resolution written in the jpeg files, png files are written as taken
+        :return: None
+        """
+        self._queue.put((png, path, format, quality, dpi))
+
+    def flush(self):
+        """
+        Wait until all the queued images are written
+        :return: list of error messages of the images that could not be written
+        """
+        self._queue.join()
+        return self.get_errors()
+
+    def get_errors(self):
+        """
+        Return the errors of the images written so far, without waiting for the queued images
+        :return: list of error messages, each error is returned once
+        """
+        with self._lock:
+            errors, self._errors = self._errors, []
+        return errors
+
+
+def get_writer():
+    """
+    Return the image writer, it is started on first use
+    :return: an ImageWriter
+    """
+    global WRITER
+    with WRITER_LOCK:
+        if WRITER is None:
+            WRITER = ImageWriter()
+        return WRITER
+
+
+def write(png, path, format=settings.IMAGE_FORMAT, quality=settings.IMAGE_QUALITY, dpi=settings.IMAGE_DPI,
+          wait=False):
+    """
+    Write a png screenshot in the output format, in background unless settings.IMAGE_ASYNC is False or wait is True
+    :param png: the png bytes
+    :param path: the output path
+    :param format: "png", "jpeg" or "webp"
+    :param quality: jpeg and webp quality
+    :param dpi: resolution written in the jpeg files, png files are written as taken
+    :param wait: if True write the image before returning
+    :return: the path
+    """
+    if wait or not settings.IMAGE_ASYNC:
+        return encode(png, path, format, quality, dpi)
+    get_writer().put(png, path, format, quality, dpi)
+    return path
+
+
+def get_errors():
+    """
+    Return the errors of the images written so far in background, without waiting for the queued images
+    :return: list of error messages, each error is returned once
+    """
+    if WRITER is None:
+        return []
+    return WRITER.get_errors()
+
+
+@atexit.register
+def flush():
+    """
+    Wait until all the queued images are written, called also when the program exits
+    :return: list of error messages of the images that could not be written
+    """
+    if WRITER is None:
+        return []
+    errors = WRITER.flush()
+    for error in errors:
+        print("image not saved " + error)
+    return errors
@@ -8,16 +8,15 @@
 #
 # Updated:     08/10/2017
 #-------------------------------------------------------------------------------
-import urllib.request
-import urllib.error
 import os
 import shutil
 import zipfile
-import io
 import sys
 import copy
+import json
+import itertools
+import hashlib
 
-import shapefile
 from psycopg2.extensions import AsIs
 
 from osgeo import ogr
@@ -25,20 +24,36 @@ from osgeo import osr
 
 import folium
 from folium.features import DivIcon
+from branca.element import MacroElement, Template, JavascriptLink
 from selenium import webdriver
-from PIL import Image
 
 import utils
 import settings
+import shapeheader
+import shapeload
+import reproject
+import download
+import containment
+import geocache
+import tileserver
+import bookmarks
+import imagewriter
 
 
-# global variable to store the states geojson
-GEOJSON = None
+# global variable to store the states geojson, one for each simplification level
+GEOJSON = {}
+# global variable to store the fingerprint of the states table the geojson is built from
+GEOJSON_VERSION = None
+
+# insert a bookmark and build its geometry in the same statement, parameters are lat, lon, label, size, state
+INSERT_BOOKMARK = """INSERT INTO """ + settings.BOOKMARKS_TABLE_NAME + """(lat, lon, label, size, state, geom)
+                     VALUES ($1, $2, $3, $4, $5, ST_SetSRID(ST_MakePoint($2, $1), 4326)) RETURNING id"""
 
 
 def download_zip(url, folder=None):
     """
-    This function will download a zip file to disk
+    This function will download a zip file to disk, a file downloaded before is downloaded again only if it changed,
+    a partial download is resumed, the mirrors in settings.DOWNLOAD_MIRRORS are tried if the url does not work
     :param url:
     :param folder: a folder to save the file, if None will download to this script folder
     :return: a tuple with path to folder and the filename
@@ -51,22 +66,21 @@ def download_zip(url, folder=None):
 
     # Download the file from "url" and save it locally under "file_name":
     try:
-        with urllib.request.urlopen(url) as response, open(folder + "/" + file_name, 'wb') as out_file:
-            shutil.copyfileobj(response, out_file)
-    except urllib.error.URLError as e:
-        print('urllib.error.URLError')
-        raise Exception(e)
+        used, status = download.fetch(download.get_urls(url), folder + "/" + file_name,
+                                      settings.DOWNLOAD_CHECKSUMS.get(file_name))
+        print(file_name + " " + status + " from " + used)
     except Exception as e:
         raise Exception(e)
     else:
         return folder,file_name
 
 
-def unzip(folder, file_name):
+def unzip(folder, file_name, members=None):
     """
-    Unzip a .zip
+    Unzip a .zip, each file is copied to disk a chunk at a time and is never read in memory as a whole
     :param folder: the path to the folder with the zip file
     :param file_name: the zip file name
+    :param members: list of the names of the files to unzip, if None unzip all the files
     :return: the folder name of the folder with the extracted files
     """
 
@@ -74,25 +88,21 @@ def unzip(folder, file_name):
     if not os.path.exists(folder + "/" + base):  #create a new directory if not existing
        os.mkdir(folder + "/" + base)
 
-    z = None
-    zipShape = None
     try:
-       z = open(folder + "/" + file_name,"rb")
-       zipShape = zipfile.ZipFile(z)
-
-       #print (zipShape.namelist()) #list the zip content
-       for fileName in zipShape.namelist():  #unzip files
-            out = open(folder + "/" + base+'/'+fileName, "wb")
-            out.write(zipShape.read(fileName))
-            out.close()
+       with zipfile.ZipFile(folder + "/" + file_name) as zipShape:
+           #print (zipShape.namelist()) #list the zip content
+           for fileName in zipShape.namelist():  #unzip files
+                if fileName.endswith("/") or (members is not None and fileName not in members):
+                    continue
+                # files are written in the folder, paths inside the zip are ignored
+                with zipShape.open(fileName) as source, \
+                        open(folder + "/" + base + '/' + os.path.basename(fileName), "wb") as out:
+                    shutil.copyfileobj(source, out, settings.UNZIP_CHUNK)
 
     except Exception as e:
         raise Exception(e)
     else:
         return base
-    finally:
-       if zipShape: zipShape.close()
-       if z: z.close()
 
 
 def check_shapefile(folder):
@@ -132,10 +142,9 @@ def check_shapefile(folder):
         if len(file) > 1:
             raise Exception("zip file should contain only 1 shapefile ")
 
-        # check this is a polygon shapefile
-        sf = shapefile.Reader(folder + "/" + file[0])
-        shapes = sf.shapes()
-        if shapes[0].shapeType not in [5, 15, 25]:  # check polygon shapetypes
+        # check this is a polygon shapefile, only the file headers and a sample of records are read
+        info = shapeheader.check_files(folder + "/" + file[0] + ".shp")
+        if info["shapetype"] not in shapeheader.POLYGON_TYPES:  # check polygon shapetypes
             raise Exception("shapefile should be polygon")
 
         return file[0]+".shp"
@@ -143,6 +152,35 @@ def check_shapefile(folder):
         raise Exception(e)
 
 
+def check_zipped_shapefile(zippath):
+    """
+    Check the zip file contains the three mandatory files of 1 polygon shapefile, nothing is extracted:
+    the file names are read from the zip directory and the shape type from the file headers
+    :param zippath: path to the zip file
+    :return: the GDAL path of the shapefile inside the zip file, it can be opened by get_epsg and reproject.reproject_file
+    """
+    try:
+        with zipfile.ZipFile(zippath) as z:
+            files = [i for i in z.namelist() if not i.endswith("/")]
+        sfiles = {i.split('.')[-1].lower() for i in files}
+        if not sfiles >= settings.SHAPE_MANDATORY_FILES:
+            raise Exception("A shapefile should contain " + str(settings.SHAPE_MANDATORY_FILES))
+
+        # check if there is only one shapefile
+        file = [i for i in files if i.lower().endswith(".shp")]
+        if len(file) > 1:
+            raise Exception("zip file should contain only 1 shapefile ")
+
+        # check this is a polygon shapefile
+        info = shapeheader.check_zip(zippath, file[0])
+        if info["shapetype"] not in shapeheader.POLYGON_TYPES:
+            raise Exception("shapefile should be polygon")
+
+        return "/vsizip/" + os.path.abspath(zippath).replace("\\", "/") + "/" + file[0]
+    except Exception as e:
+        raise Exception(e)
+
+
 def check_table(schemaname=settings.DEFAULT_SCHEMA, tablename=settings.STATES):
     """
     Check if the table exercise.states is already in the database
@@ -151,55 +189,51 @@ def check_table(schemaname=settings.DEFAULT_SCHEMA, tablename=settings.STATES):
     :return: True if table exists otherwise False
     """
 
-    conn = None
-    cur = None
-
     try:
 
-        conn = utils.pgconnect(**settings.DEFAULT_CONNECTION)
-        cur = conn.cursor()
-        cur.execute("""SELECT to_regclass('%s.%s');""", (AsIs(schemaname), AsIs(tablename)))
-        result = cur.fetchone()[0]
+        with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+            cur.execute("""SELECT to_regclass('%s.%s');""", (AsIs(schemaname), AsIs(tablename)))
+            result = cur.fetchone()[0]
 
         return (True if result else False)
 
     except Exception as e:
         raise Exception(e)
 
-    finally:
-        if conn: conn = None
-        if cur: cur = None
-
 
 def upload_shape(shapepath):
     """
     Upload file to database
-    :param shapepath: path to the shapefile
+    :param shapepath: path to the shapefile, with the copy loader it can be a GDAL virtual path such as /vsizip/
     :return: None
     """
 
-    conn = None
-    cur = None
-
-    try:
-        # first create the sqlstring with inserts
-        # call PGSQL2SHP with some parameters, -s 4326 to set lat/lon srid, -I to create a spatial index on the geometry column
-        params = [settings.SHP2PGSQL, "-s", "4326", "-I", shapepath, settings.STATES_TABLE_NAME]
-        sqlstring,info = utils.run_tool(params)
-        if not sqlstring:
-            raise Exception("cannot upload file to database")
-
-        #then use the sqlstring
-        conn = utils.pgconnect(**settings.DEFAULT_CONNECTION)
-        cur = conn.cursor()
-        cur.execute(sqlstring)
+    with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+        if settings.SHAPE_LOADER == "copy":
+            # features are streamed to the table with a binary COPY, then the spatial index is created
+            if shapeload.count_features(shapepath) >= settings.INGEST_PARALLEL_MIN:
+                # big layers are loaded in chunks by a pool of processes, each with its own connection
+                shapeload.parallel_load(shapepath, settings.STATES_TABLE_NAME, 4326)
+            else:
+                shapeload.load(cur, shapepath, settings.STATES_TABLE_NAME, 4326)
+        else:
+            # first create the sqlstring with inserts
+            # call PGSQL2SHP with some parameters, -s 4326 to set lat/lon srid, -I to create a spatial index on the geometry column
+            params = [settings.SHP2PGSQL, "-s", "4326", "-I", shapepath, settings.STATES_TABLE_NAME]
+            sqlstring,info = utils.run_tool(params)
+            if not sqlstring:
+                raise Exception("cannot upload file to database")
+            #then use the sqlstring
+            cur.execute(sqlstring)
+        # split the states in small pieces for the point checks
+        containment.build_subdivided(cur)
+        # simplify the states for the web map
+        containment.build_simplified(cur)
         conn.commit()
 
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
+    # the states changed, forget the downloaded geojson and the in memory index
+    invalidate_geojson()
+    containment.invalidate()
 
 
 def upload_point(x, y, label=""):
@@ -209,89 +243,78 @@ def upload_point(x, y, label=""):
     :param x: point longitude (wgs84) as string
     :param y: point latitude (wgs84) as string
     :param label: point label
-    :return: ("longitude","latitude", size) ; coordinates are cropped to 4 decimal digits, size will be the bookmark size
+    :return: ("longitude","latitude", size, id) ; coordinates are cropped to 4 decimal digits, size will be the bookmark size,
+     id is the new bookmark id
     """
 
-    conn = None
-    cur = None
-
     try:
-        # check the point is inside the usa, both point and states must be WGS84
-        conn = utils.pgconnect(**settings.DEFAULT_CONNECTION)
-        cur = conn.cursor()
-        #if the point is inside this will return (True,) otherwise None
-        cur.execute("""select result from
-                        (select st_contains(s.geom,ST_GeomFromText('POINT(%s %s)', 4326)) as result 
-                          from %s as s) as subquery
-                          where result is true""",(AsIs(x),AsIs(y), AsIs(settings.STATES_TABLE_NAME)))
-
-        result = cur.fetchone()
-        #print(result)
-
-        if result: # if result is not None
-
-            #check numbers size, crop to 4 digits, define the marker size
-
-            # size symbol
-            size=None
-
-            # store number of decimal digits
-            lx = 0
-            ly = 0
-
-            # convert numbers to string
-            #x = str(x);y = str(y)
-
-            if ',' in x or ',' in y:
-                raise Exception("decimal numbers should not contain ','")
-
-            # check the number of decimal digits and crop to 4
-            if '.' in x:  # do only for float number
-                lx = len(x.split('.')[1])  # get decimals
-                if lx > 4:  # crop size to 4
-                    x = x[:(4 - lx)]
-                    lx = 4
-            if '.' in y:  # do only for float number
-                ly = len(y.split('.')[1])
-                if ly > 4:
-                    y = y[:(4 - ly)]
-                    ly = 4
-
-            # select a symbol size according
-            # for the size take the bigger number of digits of the two numbers
-            ndigits = max([lx, ly])
-            if ndigits == 0:
-                size = 5
-            elif ndigits == 1:
-                size = 4
-            elif ndigits == 2:
-                size = 3
-            elif ndigits == 3:
-                size = 2
-            elif ndigits == 4:
-                size = 1
-
-            #upload to database
-            cur.execute(
-                    """INSERT INTO %s(lat,lon,label,size) VALUES (%s,%s,%s,%s) RETURNING id""",
-                        ( AsIs(settings.BOOKMARKS_TABLE_NAME),  y, x, label, size))
-            #id = cur.fetchone()[0]
-            #print(id)
-            cur.execute("""UPDATE %s SET geom = ST_PointFromText('POINT(' || lon || ' ' || lat || ')', 4326)""", (AsIs(settings.BOOKMARKS_TABLE_NAME),))
-            conn.commit()
-
-        else:
-            raise Exception("the point is not inside USA")
+        with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+            # check the point is inside the usa, both point and states must be WGS84
+            # the in memory states index is used if available, otherwise PostGIS
+            # this will return the state name, otherwise None
+            state = containment.locate(cur, float(x), float(y))
+
+            if state: # if state is not None
+
+                #check numbers size, crop to 4 digits, define the marker size
+
+                # size symbol
+                size=None
+
+                # store number of decimal digits
+                lx = 0
+                ly = 0
+
+                # convert numbers to string
+                #x = str(x);y = str(y)
+
+                if ',' in x or ',' in y:
+                    raise Exception("decimal numbers should not contain ','")
+
+                # check the number of decimal digits and crop to 4
+                if '.' in x:  # do only for float number
+                    lx = len(x.split('.')[1])  # get decimals
+                    if lx > 4:  # crop size to 4
+                        x = x[:(4 - lx)]
+                        lx = 4
+                if '.' in y:  # do only for float number
+                    ly = len(y.split('.')[1])
+                    if ly > 4:
+                        y = y[:(4 - ly)]
+                        ly = 4
+
+                # select a symbol size according
+                # for the size take the bigger number of digits of the two numbers
+                ndigits = max([lx, ly])
+                if ndigits == 0:
+                    size = 5
+                elif ndigits == 1:
+                    size = 4
+                elif ndigits == 2:
+                    size = 3
+                elif ndigits == 3:
+                    size = 2
+                elif ndigits == 4:
+                    size = 1
+
+                #upload to database, the geometry is built by the same statement
+                utils.pgprepare(cur, "insert_bookmark", INSERT_BOOKMARK,
+                                ["float8", "float8", "varchar", "smallint", "varchar"])
+                cur.execute("""EXECUTE insert_bookmark (%s, %s, %s, %s, %s)""", (y, x, label, size, state))
+                id = cur.fetchone()[0]
+                conn.commit()
+
+                # the bookmarks tiles must be made again
+                tileserver.invalidate(settings.BOOKMARKS)
+
+            else:
+                raise Exception("the point is not inside USA")
 
     except Exception as e:
         raise Exception(e)
 
     else:
-        return x, y, size #return the cropped coordinates and marker size
-
-    finally:
-        if cur: cur = None
-        if conn: conn = None
+        return x, y, size, id #return the cropped coordinates, marker size and bookmark id
 
 
 def get_epsg(path):
@@ -444,7 +467,7 @@ def save_vector(dataset, outpath, driver=None):
         dst_ds = None  # Flush the dataset to disk
 
 
-def simple_map(location = [48, -102] , zoom=3, tiles=settings.TILES):
+def simple_map(location = settings.MAP_CENTER , zoom=settings.MAP_ZOOM, tiles=settings.TILES):
     """
     Initialize a map
     :param location:
@@ -481,6 +504,17 @@ def get_class_size(size):
     return s
 
 
+def get_marker_html(size, marker=settings.MARKER, color=settings.MARKER_COLOR):
+    """
+    Return the html of a font-awesome marker
+    :param size: marker size, number between 1 and 5
+    :param marker: a font-awesome marker
+    :param color: the marker color
+    :return: string
+    """
+    return '<i class="fa '+marker+' '+get_class_size(size)+'" style="color:'+color+'" aria-hidden="true"></i>'
+
+
 def add_point(map, x, y, size, label, marker=settings.MARKER, color=settings.MARKER_COLOR):
     """
     Add one point to the map
@@ -493,8 +527,6 @@ def add_point(map, x, y, size, label, marker=settings.MARKER, color=settings.MAR
     :return: None
     """
 
-    s = get_class_size(size)
-
     folium.map.Marker(
         location=[y, x],
         popup=label,
@@ -502,52 +534,183 @@ def add_point(map, x, y, size, label, marker=settings.MARKER, color=settings.MAR
         icon=DivIcon(
             #icon_size=(150,36),
             icon_anchor=(0,0),
-            html='<i class="fa '+marker+' '+s+'" style="color:'+color+'" aria-hidden="true"></i>',
+            html=get_marker_html(size, marker, color),
             )
     ).add_to(map)
 
 
-def add_all_points(map, marker=settings.MARKER,color=settings.MARKER_COLOR):
+def script_json(data):
     """
-    Add all the points to the map
-    :param map: a matplotlib map object
+    Compact json written inside a script block of the page, labels typed by the users cannot close the block
+    :param data: data that can be serialized to json
+    :return: the json text
+    """
+    # "</script>" or "<!--" would end the script block, "<" appears only inside strings and "\u003c" is the same string
+    return json.dumps(data, separators=(',', ':')).replace("<", "\\u003c")
+
+
+class PointsLayer(MacroElement):
+    """ One layer of bookmarks drawn as circles on a canvas, the circle radius depends on the bookmark size """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function(map) {
+            // each row is lat, lon, size, label
+            var data = {{ this.data }};
+            var renderer = L.canvas();
+            var group = L.featureGroup();
+            for (var i = 0; i < data.length; i++) {
+                var d = data[i];
+                group.addLayer(L.circleMarker([d[0], d[1]], {renderer: renderer, radius: 2 + 2 * d[2], label: d[3],
+                    color: "{{ this.color }}", fillColor: "{{ this.color }}", fillOpacity: 0.8, weight: 1}));
+            }
+            // one popup handler for the whole layer
+            group.on('click', function(e) {
+                if (e.layer.options.label) {
+                    L.popup().setContent(e.layer.options.label).setLatLng(e.latlng).openOn(map);
+                }
+            });
+            return group.addTo(map);
+        })({{ this._parent.get_name() }});
+        {% endmacro %}
+        """)
+
+    def __init__(self, data, color=settings.MARKER_COLOR):
+        super(PointsLayer, self).__init__()
+        self._name = 'PointsLayer'
+        self.data = script_json(data)
+        self.color = color
+
+
+def add_points(map, points, marker=settings.MARKER, color=settings.MARKER_COLOR, renderer=settings.POINTS_RENDERER):
+    """
+    Add points to the map, as font-awesome markers or as a single layer of circles drawn on a canvas
+    :param map: a folium map object
+    :param points: iterable of (x, y, size, label), x and y WGS84
     :param marker: a font-awesome marker
-    :return:
+    :param color: the marker color
+    :param renderer: "markers", "canvas" or "auto"; auto uses markers for up to settings.MARKERS_MAX points
+    :return: number of points added
     """
 
-    conn = None
-    curr = None
+    if renderer not in ("markers", "canvas", "auto"):
+        raise Exception("renderer should be one of markers, canvas, auto")
+
+    points = iter(points)
+    if renderer == "auto":
+        # read only the points needed to choose, then put them back in front of the others
+        first = list(itertools.islice(points, settings.MARKERS_MAX + 1))
+        renderer = "markers" if len(first) <= settings.MARKERS_MAX else "canvas"
+        points = itertools.chain(first, points)
+
+    if renderer == "canvas":
+        rows = [[round(y, 6), round(x, 6), size, label or ""] for x, y, size, label in points]
+        map.add_child(PointsLayer(rows, color))
+        return len(rows)
+
+    count = 0
+    for x, y, size, label in points:
+        add_point(map, x, y, size, label, marker, color)
+        count += 1
+    return count
+
+
+def add_all_points(map, marker=settings.MARKER,color=settings.MARKER_COLOR, bbox=None, zoom=None, limit=None,
+                   center=settings.MAP_CENTER, renderer=settings.POINTS_RENDERER):
+    """
+    Add all the points visible in the map view to the map
+    :param map: a folium map object
+    :param marker: a font-awesome marker
+    :param bbox: (minlon, minlat, maxlon, maxlat) WGS84 of the points to add, if None use the view of zoom and center
+    :param zoom: map zoom, if bbox and zoom are None add all the points
+    :param limit: maximum number of points, None for no limit
+    :param center: [latitude, longitude] of the map center
+    :param renderer: "markers", "canvas" or "auto", see add_points
+    :return: number of points added
+    """
 
     try:
-        conn = utils.pgconnect(**settings.DEFAULT_CONNECTION)
-        cur = conn.cursor()
-        # if the point is inside this will return (True,) otherwise None
-        cur.execute("""select lon, lat, label,size from %s""", (AsIs(settings.BOOKMARKS_TABLE_NAME),))
+        #the points are read a page at a time
+        points = ((rs[1], rs[2], rs[4], rs[3]) for rs in bookmarks.iter_bookmarks(bbox, zoom, limit, center))
+        return add_points(map, points, marker, color, renderer)
 
-        result = cur.fetchall()
+    except Exception as e:
+        raise Exception(e)
 
-        #iterate and add point
-        for rs in result:
 
-            s = get_class_size(rs[3])
+class ClusterLayer(MacroElement):
+    """ One layer of circles drawn on a canvas, one circle for each group of bookmarks """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function() {
+            // each row is lat, lon, count, min size, max size, mean size, label
+            var data = {{ this.data }};
+            var renderer = L.canvas();
+            var group = L.featureGroup();
+            for (var i = 0; i < data.length; i++) {
+                var d = data[i];
+                var marker = L.circleMarker([d[0], d[1]], {renderer: renderer, radius: 3 + 2 * d[5] + 3 * Math.log(d[2]),
+                    color: "{{ this.color }}", fillColor: "{{ this.color }}", fillOpacity: 0.5, weight: 1});
+                if (d[2] == 1) {
+                    marker.bindPopup(d[6] || "");
+                } else {
+                    marker.bindPopup(d[2] + " bookmarks<br>size " + d[3] + "-" + d[4] + ", mean " + d[5]);
+                }
+                group.addLayer(marker);
+            }
+            return group.addTo({{ this._parent.get_name() }});
+        })();
+        {% endmacro %}
+        """)
+
+    def __init__(self, data, color=settings.MARKER_COLOR):
+        super(ClusterLayer, self).__init__()
+        self._name = 'ClusterLayer'
+        self.data = script_json(data)
+        self.color = color
+
+
+def get_clusters(zoom, pixels=settings.CLUSTER_PIXELS):
+    """
+    Group the bookmarks with a grid in web mercator, the grid cell size depends on the map zoom
+    so that the number of groups depends on the map size and not on the number of bookmarks
+    :param zoom: map zoom
+    :param pixels: grid cell size in screen pixels
+    :return: list of [lat, lon, count, min size, max size, mean size, label], label is only set for groups of 1 bookmark
+    """
 
-            folium.map.Marker(
-                location=[rs[1],rs[0]],
-                popup=rs[2],
+    # web mercator meters of one screen pixel at this zoom
+    cellsize = pixels * 2 * tileserver.WORLD / 256 / 2 ** zoom
 
-                icon=DivIcon(
-                    # icon_size=(150,36),
-                    icon_anchor=(0, 0),
-                    html='<i class="fa '+marker+' ' + s + '" style="color:'+color+'" aria-hidden="true"></i>'
-                )
-            ).add_to(map)
+    try:
+        with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+            cur.execute("""SELECT ST_Y(c), ST_X(c), n, minsize, maxsize, meansize, label FROM
+                             (SELECT ST_Transform(ST_SetSRID(ST_MakePoint(avg(ST_X(p)), avg(ST_Y(p))), 3857), 4326) AS c,
+                                     count(*) AS n, min(size) AS minsize, max(size) AS maxsize,
+                                     round(avg(size), 1)::float8 AS meansize,
+                                     CASE WHEN count(*) = 1 THEN min(label) END AS label
+                              FROM (SELECT ST_Transform(geom, 3857) AS p, size, label FROM %s
+                                    WHERE geom IS NOT NULL) AS b
+                              GROUP BY ST_SnapToGrid(p, %s)) AS q""",
+                        (AsIs(settings.BOOKMARKS_TABLE_NAME), cellsize))
+            return [list(r) for r in cur.fetchall()]
 
     except Exception as e:
         raise Exception(e)
 
-    finally:
-        if cur: cur = None
-        if conn: conn = None
+
+def add_clustered_points(map, zoom=settings.MAP_ZOOM, color=settings.MARKER_COLOR):
+    """
+    Add all the points to the map grouped in clusters, the circle size depends on the number of bookmarks and their size
+    :param map: a folium map object
+    :param zoom: map zoom used to group the bookmarks
+    :param color: the circles color
+    :return: a dictionary with the number of bookmarks and clusters
+    """
+    clusters = get_clusters(zoom)
+    map.add_child(ClusterLayer(clusters, color))
+    return {"bookmarks": sum(c[2] for c in clusters), "clusters": len(clusters)}
 
 
 def save_map(map, name="index.html", folder=None):
@@ -568,40 +731,80 @@ def save_map(map, name="index.html", folder=None):
     return folder + "/" + name
 
 
-def get_geojson():
+def get_level(zoom):
+    """
+    Return the simplification level for a map zoom
+    :param zoom: map zoom
+    :return: index of settings.SIMPLIFY_LEVELS
+    """
+    level = 0
+    for i, (minzoom, tolerance, digits) in enumerate(settings.SIMPLIFY_LEVELS):
+        if minzoom <= zoom:
+            level = i
+    return level
+
+
+def get_geojson(zoom=None):
     """
     Download geojson from the database
-    :return: None
+    :param zoom: map zoom used to choose the simplified geometry, if None use the full resolution geometry
+    :return: the geojson
     """
 
+    level = None if zoom is None else get_level(zoom)
+
     # check the file was already downloaded
-    global GEOJSON
-    if GEOJSON: return GEOJSON
+    global GEOJSON, GEOJSON_VERSION
+    if level in GEOJSON: return GEOJSON[level]
+
+    # name of the disk cache file
+    if level is None:
+        name = "states_full"
+    else:
+        name = "states_" + "_".join(str(i) for i in settings.SIMPLIFY_LEVELS[level])
 
-    conn = None
-    cur = None
     try:
 
-        conn = utils.pgconnect(**settings.DEFAULT_CONNECTION)
-        cur = conn.cursor()
-        cur.execute(    """SELECT row_to_json(fc) FROM 
-                          ( SELECT 'FeatureCollection' As type, array_to_json(array_agg(f)) As features
-                          FROM (SELECT 'Feature' As type , ST_AsGeoJSON(lg.geom)::json As geometry, row_to_json(lp) As properties
-                           FROM %s As lg  INNER JOIN (SELECT gid,name FROM %s) As lp
-                               ON lg.gid = lp.gid ) As f)  As fc;""", (AsIs(settings.STATES_TABLE_NAME),AsIs(settings.STATES_TABLE_NAME)))
-        result = cur.fetchone()[0]
+        with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+            # check the disk cache built from the same states table
+            if GEOJSON_VERSION is None:
+                GEOJSON_VERSION = geocache.fingerprint(cur)
+            result = geocache.load(name, GEOJSON_VERSION)
+            if result is not None:
+                GEOJSON[level] = result
+                return result
+
+            if level is None:
+                cur.execute(    """SELECT row_to_json(fc) FROM 
+                                  ( SELECT 'FeatureCollection' As type, array_to_json(array_agg(f)) As features
+                                  FROM (SELECT 'Feature' As type , ST_AsGeoJSON(lg.geom)::json As geometry, row_to_json(lp) As properties
+                                   FROM %s As lg  INNER JOIN (SELECT gid,name FROM %s) As lp
+                                       ON lg.gid = lp.gid ) As f)  As fc;""", (AsIs(settings.STATES_TABLE_NAME),AsIs(settings.STATES_TABLE_NAME)))
+            else:
+                cur.execute("""SELECT geojson FROM %s WHERE level = %s""",
+                            (AsIs(settings.STATES_GEOJSON_TABLE_NAME), level))
+            result = cur.fetchone()[0]
 
         #print(result)
 
-        #make the result global
-        GEOJSON = result
+        #make the result global and save it to disk
+        GEOJSON[level] = result
+        geocache.save(name, GEOJSON_VERSION, result)
+        return result
 
     except Exception as e:
         raise Exception(e)
 
-    finally:
-        if conn: conn = None
-        if cur: cur = None
+
+def invalidate_geojson():
+    """
+    Forget the states geojson in memory and on disk, it will be downloaded again on next use
+    :return: None
+    """
+    global GEOJSON_VERSION
+    GEOJSON.clear()
+    GEOJSON_VERSION = None
+    geocache.invalidate()
 
 
 def add_geojson(map, geojson, style_function, name='states' ):
@@ -621,47 +824,313 @@ def add_geojson(map, geojson, style_function, name='states' ):
     ).add_to(map)
 
 
-def browser(path, driver='chrome'):
+class VectorTileLayer(MacroElement):
+    """ A Leaflet.VectorGrid layer showing the states and the bookmarks tiles of the local tile server """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.vectorGrid.protobuf("{{ this.url }}", {
+            rendererFactory: L.canvas.tile,
+            interactive: true,
+            maxNativeZoom: 18,
+            vectorTileLayerStyles: {
+                "{{ this.states }}": {fill: true, fillColor: 'yellow', fillOpacity: 0.1, color: 'black', opacity: 0.1, weight: 1},
+                "{{ this.bookmarks }}": function(properties, zoom) {
+                    return {radius: 2 + 2 * properties.size, fill: true, fillColor: "{{ this.color }}", fillOpacity: 0.8,
+                            color: "{{ this.color }}", weight: 1};
+                }
+            }
+        }).on('click', function(e) {
+            if (e.layer.properties.label) {
+                L.popup().setContent(e.layer.properties.label).setLatLng(e.latlng).openOn({{ this._parent.get_name() }});
+            }
+        }).addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+        """)
+
+    def __init__(self, layer, color=settings.MARKER_COLOR):
+        super(VectorTileLayer, self).__init__()
+        self._name = 'VectorTileLayer'
+        self.url = tileserver.get_url(layer)
+        self.states = settings.STATES
+        self.bookmarks = settings.BOOKMARKS
+        self.color = color
+
+
+def add_vector_tiles(map, layer, color=settings.MARKER_COLOR):
+    """
+    Add a vector tile layer of the local tile server to the map, the tile server is started if not running
+    :param map: a map object
+    :param layer: the layer name, settings.STATES or settings.BOOKMARKS
+    :param color: the bookmarks color
+    :return: None
+    """
+    tileserver.start()
+    map.get_root().header.add_child(JavascriptLink(settings.VECTORGRID_JS), name='vectorgrid')
+    map.add_child(VectorTileLayer(layer, color))
+
+
+class LayersMap(MacroElement):
+    """ Load the states and the bookmarks from script files next to the page, the page itself never changes """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function(map) {
+            var markers = {{ this.markers }};
+            var bookmarks = L.featureGroup().addTo(map);
+            window.statesLoaded = function(geojson) {
+                L.geoJson(geojson, {style: function(feature) { return {{ this.style }}; }}).addTo(map);
+            };
+            var renderer = L.canvas();
+            window.bookmarksLoaded = function(points) {
+                bookmarks.clearLayers();
+                // font-awesome markers for few points, circles on a canvas for many
+                var canvas = points.length > {{ this.maxmarkers }};
+                for (var i = 0; i < points.length; i++) {
+                    var p = points[i];
+                    if (canvas) {
+                        L.circleMarker([p[0], p[1]], {renderer: renderer, radius: 2 + 2 * p[2], label: p[3],
+                            color: "{{ this.color }}", fillColor: "{{ this.color }}", fillOpacity: 0.8, weight: 1})
+                            .addTo(bookmarks);
+                    } else {
+                        L.marker([p[0], p[1]], {icon: L.divIcon({html: markers[p[2]], iconAnchor: [0, 0], className: 'empty'}),
+                            label: p[3]}).addTo(bookmarks);
+                    }
+                }
+            };
+            bookmarks.on('click', function(e) {
+                if (e.layer.options.label) {
+                    L.popup().setContent(e.layer.options.label).setLatLng(e.latlng).openOn(map);
+                }
+            });
+            function load(src) {
+                var script = document.createElement('script');
+                script.src = src;
+                document.body.appendChild(script);
+            }
+            {% if this.states %}load("{{ this.states }}");{% endif %}
+            // the bookmarks file is written again on each update, never use a cached copy
+            load("{{ this.bookmarks }}?" + Date.now());
+            return bookmarks;
+        })({{ this._parent.get_name() }});
+        {% endmacro %}
+        """)
+
+    def __init__(self, states, bookmarks=settings.BOOKMARKS_FILE, marker=settings.MARKER, color=settings.MARKER_COLOR):
+        super(LayersMap, self).__init__()
+        self._name = 'LayersMap'
+        self.states = states
+        self.bookmarks = bookmarks
+        self.markers = json.dumps({size: get_marker_html(size, marker, color) for size in range(1, 6)})
+        self.style = json.dumps(utils.style_function(None))
+        self.color = color
+        # biggest number of bookmarks drawn as markers
+        self.maxmarkers = settings.MARKERS_MAX
+        if settings.POINTS_RENDERER == "canvas": self.maxmarkers = -1
+        if settings.POINTS_RENDERER == "markers": self.maxmarkers = 2 ** 53
+
+
+def write_if_changed(path, text):
+    """
+    Write a text file, an existing file is replaced only if the text changed
+    :param path: the path to the file
+    :param text: the file content
+    :return: True if the file was written
+    """
+    data = text.encode("utf-8")
+    if os.path.exists(path) and os.path.getsize(path) == len(data):
+        with open(path, "rb") as f:
+            if f.read() == data: return False
+    temp = path + ".tmp"
+    with open(temp, "wb") as f:
+        f.write(data)
+    os.replace(temp, path)  # the browser never reads a partial file
+    return True
+
+
+def save_states_layer(zoom=settings.MAP_ZOOM, folder=None):
+    """
+    Write the states geojson to a script file named with the hash of its content,
+    the file is written only once for each version of the states
+    :param zoom: zoom used to choose the simplified states, None for full resolution
+    :param folder: folder to save to, if None save to current program folder
+    :return: the file name
+    """
+    if not folder:
+        folder = os.path.dirname(os.path.abspath(__file__))
+
+    text = json.dumps(get_geojson(zoom), separators=(",", ":"))
+    name = settings.STATES + "-" + hashlib.sha1(text.encode("utf-8")).hexdigest()[:12] + ".geojson.js"
+    if not os.path.exists(folder + "/" + name):
+        write_if_changed(folder + "/" + name, "statesLoaded(" + text + ");")
+    return name
+
+
+def save_bookmarks_layer(points, folder=None, name=settings.BOOKMARKS_FILE):
+    """
+    Write the bookmarks shown by a page of the "layers" mode, reload the page to show them
+    :param points: iterable of (x, y, size, label), x and y WGS84
+    :param folder: folder to save to, if None save to current program folder
+    :param name: the file name
+    :return: number of bookmarks written
+    """
+    if not folder:
+        folder = os.path.dirname(os.path.abspath(__file__))
+
+    rows = [[round(y, 6), round(x, 6), int(size), label or ""] for x, y, size, label in points]
+    write_if_changed(folder + "/" + name, "bookmarksLoaded(" + json.dumps(rows, separators=(",", ":")) + ");")
+    return len(rows)
+
+
+def save_base_map(map, folder=None):
+    """
+    Save a page of the "layers" mode, the page is named with the hash of its content and written only if missing,
+    so the same page is reused until the states or the map settings change
+    :param map: a map object
+    :param folder: folder to save to, if None save to current program folder
+    :return: the path to the page
+    """
+    if not folder:
+        folder = os.path.dirname(os.path.abspath(__file__))
+
+    # folium names the map elements with random ids, number them so that the same map gives the same page
+    counter = itertools.count()
+    elements = [map.get_root()]
+    while elements:
+        element = elements.pop(0)
+        element._id = str(next(counter))
+        elements.extend(element._children.values())
+
+    html = map.get_root().render()
+    path = folder + "/map-" + hashlib.sha1(html.encode("utf-8")).hexdigest()[:12] + ".html"
+    if not os.path.exists(path):
+        write_if_changed(path, html)
+    return path
+
+
+def states_map(zoom=settings.MAP_ZOOM, geojson_zoom=settings.MAP_ZOOM, folder=None):
+    """
+    Initialize a map with the states, in tiles mode the map also shows all the bookmarks
+    :param zoom: map zoom
+    :param geojson_zoom: zoom used to choose the simplified states, None for full resolution
+    :param folder: folder of the page, in layers mode the states file is written there
+    :return: the map object
+    """
+    map = simple_map(zoom=zoom)
+    if settings.MAP_MODE == "tiles":
+        # states and all the bookmarks are read from the tile server
+        add_vector_tiles(map, settings.STATES)
+        add_vector_tiles(map, settings.BOOKMARKS)
+    elif settings.MAP_MODE == "layers":
+        # states and bookmarks are read from files next to the page
+        map.add_child(LayersMap(save_states_layer(geojson_zoom, folder)))
+    else:
+        add_geojson(map, get_geojson(geojson_zoom), utils.style_function)
+    return map
+
+
+def browser(path, driver='chrome', headless=False, size=None):
     """
     Open a web page with a browser
     :param path: the path to the html file
     :param driver: the driver name
+    :param headless: if True the browser has no window, only chrome and firefox can run headless
+    :param size: (width, height) of the browser window in pixels, if None use the default size
     :return: webdriver object
     """
 
     if driver=='chrome':
-        driver = webdriver.Chrome()
+        options = webdriver.ChromeOptions()
+        if headless: options.add_argument("--headless")
+        driver = webdriver.Chrome(options=options)
     elif driver=='firefox':
-        driver = webdriver.Firefox()
+        options = webdriver.FirefoxOptions()
+        if headless: options.add_argument("-headless")
+        driver = webdriver.Firefox(options=options)
     elif driver=='edge':
+        if headless: raise Exception("driver edge cannot run headless")
         driver = webdriver.Edge()
     else:
         raise Exception("driver "+driver+ " is not supported")
 
+    if size: driver.set_window_size(size[0], size[1])
     driver.get("file:///"+ path)
     return driver
 
 
-def save_image(driver, outname="states.jpeg", folder=None):
+def push_points(driver, mapname, points, clear=False, marker=settings.MARKER, color=settings.MARKER_COLOR):
+    """
+    Add points to the map shown by the browser without reloading the page, the points go to a layer
+    that lives until the page is reloaded
+    :param driver: the selenium driver
+    :param mapname: the name of the folium map shown in the page, map.get_name()
+    :param points: iterable of (x, y, size, label), x and y WGS84
+    :param clear: if True remove the points added before
+    :param marker: a font-awesome marker
+    :param color: the marker color
+    :return: number of points added
+    """
+
+    script = """
+        var map = window[arguments[0]];
+        if (!window.liveBookmarks) { window.liveBookmarks = L.featureGroup().addTo(map); }
+        if (arguments[1]) { window.liveBookmarks.clearLayers(); }
+        var points = arguments[2];
+        for (var i = 0; i < points.length; i++) {
+            var p = points[i];
+            L.marker([p[0], p[1]], {icon: L.divIcon({html: p[2], iconAnchor: [0, 0], className: 'empty'})})
+                .bindPopup(p[3]).addTo(window.liveBookmarks);
+        }
+        """
+
+    count = 0
+    chunk = []
+    for x, y, size, label in points:
+        chunk.append([y, x, get_marker_html(size, marker, color), label or ""])
+        if len(chunk) == settings.LIVE_CHUNK:
+            driver.execute_script(script, mapname, clear and not count, chunk)
+            count += len(chunk)
+            chunk = []
+    if chunk or (clear and not count):
+        driver.execute_script(script, mapname, clear and not count, chunk)
+        count += len(chunk)
+    return count
+
+
+def redraw_tiles(driver):
+    """
+    Read again the vector tiles of the map shown by the browser without reloading the page
+    :param driver: the selenium driver
+    :return: None
+    """
+    driver.execute_script("""
+        for (var name in window) {
+            var map = window[name];
+            if (name.indexOf('map_') === 0 && map instanceof L.Map) {
+                map.eachLayer(function(layer) { if (layer instanceof L.VectorGrid) { layer.redraw(); } });
+            }
+        }""")
+
+
+def save_image(driver, outname="states.jpeg", folder=None, format=settings.IMAGE_FORMAT, wait=False):
     """
-    Save screenshot at 200dpi in jpeg format
+    Save screenshot in settings.IMAGE_FORMAT, the image is encoded and written by a background thread
+    (imagewriter.flush() waits for it) unless settings.IMAGE_ASYNC is False or wait is True
     :param driver: the selenium driver
+    :param outname: the image name, the extension is changed to the one of the format
     :param folder: folder to save the image to , if None save to the program folder
-    :return:
+    :param format: "png", "jpeg" or "webp"
+    :param wait: if True write the image before returning
+    :return: the path to the image
     """
 
     # set the output folder
     if not folder:
         folder = os.path.dirname(os.path.abspath(__file__))
 
-    # get thescreenshot
+    # get the screenshot, png is written without decoding it
     binary = driver.get_screenshot_as_png()
-    stream = io.BytesIO(binary)
-
-    # save screenshot in jpeg format
-    img = Image.open(stream)
-    img = img.convert(mode="RGB")
-    img.save(folder + '/' + outname, format='JPEG', dpi=(200,200))
+    return imagewriter.write(binary, folder + '/' + imagewriter.get_name(outname, format), format, wait=wait)
 
 
 if __name__ == '__main__':
@@ -674,15 +1143,31 @@ if __name__ == '__main__':
             if driver:driver.quit()
             sys.exit()
 
-    def refreshmap():
-        map = simple_map()
-        get_geojson()
-        add_geojson(map, GEOJSON, utils.style_function)
-        return map
+    def refreshmap(zoom=settings.MAP_ZOOM):
+        return states_map(zoom, zoom)
+
+    def saved(image):
+        # in background the image is only queued, the errors of the images written before are reported here
+        for error in imagewriter.get_errors():
+            print("image not saved " + error)
+        if settings.IMAGE_ASYNC:
+            print("image " + os.path.basename(image) + " queued, it is saved on disk in background")
+        else:
+            print("image " + os.path.basename(image) + " saved on disk")
 
     print("Welcome. To quit the program type q")
     print("This program will use the folder " + os.path.dirname(os.path.abspath(__file__)) +" to download data and images")
     exists = check_table()
+    if exists and not check_table(tablename=settings.STATES_SUBDIVIDED):
+        print("Creating the table '" + settings.STATES_SUBDIVIDED_TABLE_NAME + "' used to check the points")
+        with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+            containment.build_subdivided(cur)
+            conn.commit()
+    if exists and not check_table(tablename=settings.STATES_GEOJSON):
+        print("Creating the table '" + settings.STATES_GEOJSON_TABLE_NAME + "' with the simplified states")
+        with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+            containment.build_simplified(cur)
+            conn.commit()
     if exists: print("The table 'exercise.states' already exists and will be used. Drop it if a new table is required")
 
     while True:
@@ -709,11 +1194,21 @@ if __name__ == '__main__':
         exit(value)
 
         try:
+            if settings.READ_ZIPPED:
+                # the shapefile is read inside the zip, files are extracted only for the upload
+                print("Checking the zip content")
+                shapepath = check_zipped_shapefile(folder + "/" + file_name)
+                base = os.path.splitext(file_name)[0]
+                shapename = os.path.basename(shapepath)
+                print("zip file contains 1 shapefile of type polygon/multipolygon called " + shapename)
+                print(".shp,.dbf, .shx mandatory files are there")
+                break
             print("Unzipping...")
             base = unzip(folder, file_name)
             print("Unzipping succeeded")
             print("Checking the folder content")
             shapename = check_shapefile(folder + "/" + base + '/')
+            shapepath = folder + "/" + base + '/' + shapename
             print("folder contains 1 shapefile of type polygon/multipolygon called " + shapename)
             print(".shp,.dbf, .shx mandatory files are there")
             break
@@ -730,18 +1225,29 @@ if __name__ == '__main__':
         try:
             print("The database will store geometry in WGS84 lat/lon")
             print("Checking coordinate system...")
-            epsg = get_epsg(folder + "/" + base + '/' + shapename)
+            epsg = get_epsg(shapepath)
             if epsg != "4326":
                 print("Coordinate system is epgs:" + epsg)
                 print("Coordinate system will be converted to epgs:4326")
-                print("reprojecting....")
-                dataset = reproject_vector(folder + "/" + base + '/' + shapename, epsg_from=int(epsg), epsg_to=4326)
-                print("overwrite shapefile...")
-                save_vector(dataset, folder + "/" + base + '/' + shapename, driver=None)
-                dataset = None
+                if settings.SHAPE_LOADER == "copy":
+                    # the copy loader reprojects the features while it uploads them
+                    print("the features will be reprojected while they are uploaded")
+                else:
+                    print("reprojecting....")
+                    # features are written to the shapefile while they are read, no copy is kept in memory
+                    reproject.reproject_file(shapepath, folder + "/" + base + '/' + shapename, 4326, int(epsg))
+                    shapepath = folder + "/" + base + '/' + shapename
+            elif shapepath.startswith("/vsizip/") and settings.SHAPE_LOADER != "copy":
+                # shp2pgsql reads files on disk, extract only the shapefile files
+                print("Unzipping...")
+                stem = os.path.splitext(shapename)[0]
+                with zipfile.ZipFile(folder + "/" + file_name) as z:
+                    members = [i for i in z.namelist() if os.path.splitext(os.path.basename(i))[0] == stem]
+                unzip(folder, file_name, members)
+                shapepath = folder + "/" + base + '/' + shapename
 
             print("uploading states")
-            upload_shape(folder + "/" + base + '/' + shapename)
+            upload_shape(shapepath)
             print("Upload succeeded")
             break
         except Exception as e:
@@ -762,14 +1268,21 @@ if __name__ == '__main__':
             # initialize map
             map=refreshmap()
 
-            path = save_map(map)
+            if settings.MAP_MODE == "layers":
+                # the page and the states file are written only if they changed, the bookmarks file is empty
+                path = save_base_map(map)
+                save_bookmarks_layer([])
+                basepath, basemap = path, map.get_name()
+            else:
+                path = save_map(map)
             driver = browser(path, settings.BROWSER)
+            livemap = map.get_name()  # name of the map in the page, used for the live updates
 
             print("Press enter to take a screenshot")
             value = input()
             exit(value)
-            save_image(driver)
-            print("image saved on disk")
+            image = save_image(driver)
+            saved(image)
             break
 
         except Exception as e:
@@ -804,21 +1317,33 @@ if __name__ == '__main__':
 
             try:
                 #check point, fix it, and upload to database
-                x,y,size = upload_point(valuex,valuey, valuel)
+                x,y,size,id = upload_point(valuex,valuey, valuel)
                 print("long(x)= " + x + " lat(y)=" + y + " label= " + valuel + " size= " + str(size))
                 #print(x,y,size)
 
                 print("plotting...")
-                map = refreshmap()
-                add_point(map, float(x), float(y), size, valuel)
-                path = save_map(map)
-                driver.refresh()
+                if settings.LIVE_UPDATE and settings.MAP_MODE == "tiles":
+                    redraw_tiles(driver)
+                elif settings.LIVE_UPDATE:
+                    # show only the new point, as a new page would
+                    push_points(driver, livemap, [(float(x), float(y), size, valuel)], clear=True)
+                elif settings.MAP_MODE == "layers":
+                    # only the bookmarks file is written, the page and the states file are reused
+                    save_bookmarks_layer([(float(x), float(y), size, valuel)])
+                    driver.get("file:///" + basepath)
+                    livemap = basemap
+                else:
+                    map = refreshmap()
+                    if settings.MAP_MODE != "tiles": add_point(map, float(x), float(y), size, valuel)
+                    path = save_map(map)
+                    driver.refresh()
+                    livemap = map.get_name()
 
                 print("Press enter to take a screenshot")
                 value = input()
                 exit(value)
-                save_image(driver,  valuel+".jpeg")
-                print("image "+valuel+".jpeg saved on disk")
+                image = save_image(driver,  valuel+".jpeg")
+                saved(image)
 
             except Exception as e:
                 print(e)
@@ -827,16 +1352,34 @@ if __name__ == '__main__':
             try:
                 # display_all_point
                 print("plotting... ")
-                map = refreshmap()
-                add_all_points(map)
-                path = save_map(map)
-                driver.refresh()
+                if settings.LIVE_UPDATE and settings.MAP_MODE == "tiles":
+                    redraw_tiles(driver)
+                elif settings.LIVE_UPDATE and settings.SHOWALL_MODE != "clusters":
+                    points = ((rs[1], rs[2], rs[4], rs[3]) for rs in bookmarks.iter_bookmarks(zoom=settings.MAP_ZOOM))
+                    push_points(driver, livemap, points, clear=True)
+                elif settings.MAP_MODE == "layers" and settings.SHOWALL_MODE != "clusters":
+                    points = ((rs[1], rs[2], rs[4], rs[3]) for rs in bookmarks.iter_bookmarks(zoom=settings.MAP_ZOOM))
+                    save_bookmarks_layer(points)
+                    driver.get("file:///" + basepath)
+                    livemap = basemap
+                else:
+                    map = refreshmap()
+                    if settings.MAP_MODE == "tiles":
+                        pass  # the bookmarks are in the tiles
+                    elif settings.SHOWALL_MODE == "clusters":
+                        summary = add_clustered_points(map)
+                        print(str(summary["bookmarks"]) + " bookmarks in " + str(summary["clusters"]) + " clusters")
+                    else:
+                        add_all_points(map, zoom=settings.MAP_ZOOM)
+                    path = save_map(map)
+                    driver.get("file:///" + path)  # in layers mode the browser shows another page
+                    livemap = map.get_name()
 
                 print("Press enter to take a screenshot")
                 value = input()
                 exit(value)
-                save_image(driver, "allpoints.jpeg")
-                print("image allpoints.jpeg saved on disk")
+                image = save_image(driver, "allpoints.jpeg")
+                saved(image)
                 break
 
             except Exception as e:
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name:        pgpool.py
+# Purpose:     thread-safe pool of reusable postgresql connections
+#
+# Author:      claudio piccinini
+#
+# Updated:     18/10/2026
+#-------------------------------------------------------------------------------
+
+import threading
+import time
+from contextlib import contextmanager
+
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+
+
+class PoolError(Exception):
+    """ Raised when a connection cannot be checked out of the pool """
+    pass
+
+
+class ConnectionPool(object):
+    """
+    A pool of postgresql connections shared between threads
+    Connections are created lazily up to maxconn, idle connections above minconn are closed when given back
+    Connections idle for more than healthcheck seconds are tested with a "SELECT 1" before being handed out
+    """
+
+    def __init__(self, connect, minconn=1, maxconn=5, timeout=30, healthcheck=30, **kwargs):
+        """
+        :param connect: a function returning a new connection, called as connect(**kwargs)
+        :param minconn: number of idle connections to keep open
+        :param maxconn: maximum number of connections open at the same time
+        :param timeout: seconds to wait for a free connection before raising PoolError, None waits forever
+        :param healthcheck: seconds of idleness after which a connection is tested before use, 0 always tests
+        :param kwargs: connection parameters passed to connect
+        """
+
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise PoolError("invalid pool size minconn="+str(minconn)+" maxconn="+str(maxconn))
+
+        self._connect = connect
+        self._kwargs = kwargs
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck = healthcheck
+
+        self._idle = []     # list of (connection, time it was given back)
+        self._used = set()  # ids of the connections checked out
+        self._size = 0      # connections currently open (idle + used)
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+
+    def _healthy(self, conn, idletime):
+        """
+        Check a connection is still usable
+        :param conn: the connection
+        :param idletime: seconds the connection has been idle
+        :return: True if the connection can be used
+        """
+        if conn.closed:
+            return False
+        if idletime < self.healthcheck:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        """ close a connection ignoring errors """
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def getconn(self, timeout=None):
+        """
+        Check out a connection, waiting if the pool is exhausted
+        :param timeout: override the pool timeout
+        :return: a connection
+        """
+        if timeout is None:
+            timeout = self.timeout
+        deadline = None if timeout is None else time.time() + timeout
+
+        while True:
+            conn = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolError("connection pool is closed")
+                    if self._idle:
+                        conn, since = self._idle.pop()
+                        break
+                    if self._size < self.maxconn:
+                        self._size += 1  # reserve a slot, connect outside the lock
+                        since = None
+                        break
+                    remaining = None if deadline is None else deadline - time.time()
+                    if remaining is not None and remaining <= 0:
+                        raise PoolError("no connection available after " + str(timeout) + " seconds")
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    conn = self._connect(**self._kwargs)
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._healthy(conn, time.time() - since):
+                self._discard(conn)
+                with self._cond:
+                    self._size -= 1
+                continue  # try again with another idle connection or a new one
+
+            with self._cond:
+                self._used.add(id(conn))
+            return conn
+
+    def putconn(self, conn, close=False):
+        """
+        Give back a connection, any open transaction is rolled back
+        :param conn: a connection obtained with getconn
+        :param close: if True close the connection instead of keeping it
+        :return: None
+        """
+        with self._cond:
+            if id(conn) not in self._used:
+                raise PoolError("connection does not belong to this pool")
+            self._used.discard(id(conn))
+
+        if not close and not conn.closed:
+            try:
+                status = conn.get_transaction_status()
+                if status == TRANSACTION_STATUS_UNKNOWN:
+                    close = True  # the connection is broken
+                elif status != TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                close = True
+
+        with self._cond:
+            if close or conn.closed or self._closed or len(self._idle) >= self.minconn:
+                self._size -= 1
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.time()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """
+        Check out a connection for the duration of a with block
+        with pool.connection() as conn:
+            cur = conn.cursor()
+        :param timeout: override the pool timeout
+        :return: a connection
+        """
+        conn = self.getconn(timeout)
+        broken = False
+        try:
+            yield conn
+        except Exception:
+            broken = bool(conn.closed)
+            raise
+        finally:
+            self.putconn(conn, close=broken)
+
+    def closeall(self):
+        """
+        Close the idle connections and refuse new checkouts, used connections are closed when given back
+        :return: None
+        """
+        with self._cond:
+            self._closed = True
+            for conn, since in self._idle:
+                self._discard(conn)
+            self._size -= len(self._idle)
+            self._idle = []
+            self._cond.notify_all()
+
+    def stats(self):
+        """
+        :return: a dictionary with the number of open, idle and used connections
+        """
+        with self._cond:
+            return {"size": self._size, "idle": len(self._idle), "used": len(self._used)}
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name:        plotexport.py
+# Purpose:     export many matplotlib maps without a window, with the Agg backend and a pool of processes,
+#               each process loads the basemap and the projected states once and reuses them for all its maps
+#               run as "python plotexport.py states|all|bookmarks|zooms [workers]"
+#
+# Author:      claudio piccinini
+#
+# Updated:     18/10/2026
+#-------------------------------------------------------------------------------
+import os
+import sys
+import time
+import multiprocessing
+
+# the backend must be chosen before pyplot is imported by secondary
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from psycopg2.extensions import AsIs
+
+import utils
+import settings
+import bookmarks
+import secondary
+
+
+def get_folder():
+    """
+    Return the output folder, it is created if not existing
+    :return: path to the folder
+    """
+    folder = settings.EXPORT_FOLDER
+    if not folder:
+        folder = os.path.dirname(os.path.abspath(__file__)) + "/exports"
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    return folder
+
+
+def states_jobs():
+    """ One job with the states only """
+    return [{"name": "states.jpg"}]
+
+
+def all_jobs():
+    """ One job with the states and all the bookmarks """
+    return [{"name": "allmarkers.jpg", "all": True}]
+
+
+def bookmark_jobs(bbox=None):
+    """
+    One job for each bookmark, the map shows the states and that bookmark
+    :param bbox: (minlon, minlat, maxlon, maxlat) WGS84 of the bookmarks, if None all the bookmarks
+    :return: a generator of jobs
+    """
+    for id, lon, lat, label, size in bookmarks.iter_bookmarks(bbox):
+        yield {"name": "bookmark_" + str(id) + ".jpg", "points": [(lon, lat, size, label)]}
+
+
+def zoom_jobs():
+    """
+    One job for each state, the map is zoomed to the state and shows the bookmarks inside its bounds
+    :return: a list of jobs
+    """
+    with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+        cur.execute("""SELECT name, ST_XMin(geom), ST_YMin(geom), ST_XMax(geom), ST_YMax(geom) FROM %s ORDER BY name""",
+                    (AsIs(settings.STATES_TABLE_NAME),))
+        rows = cur.fetchall()
+    return [{"name": r[0] + ".jpg", "bbox": tuple(r[1:]), "all": True} for r in rows]
+
+
+JOBS = {"states": states_jobs, "all": all_jobs, "bookmarks": bookmark_jobs, "zooms": zoom_jobs}
+
+
+def init_worker():
+    """
+    Prepare a worker process, the database connections of the parent are not used
+    and the basemap and the projected states are loaded once
+    :return: None
+    """
+    utils.forget_pools()
+    map = secondary.get_basemap()
+    secondary.get_states_xy(map)
+
+
+def export(job, folder):
+    """
+    Draw and save one map
+    :param job: a dictionary with "name" (image name) and optionally "points" (list of (x, y, size, label) to draw),
+     "all" (if True draw the bookmarks in the map) and "bbox" ((minlon, minlat, maxlon, maxlat) WGS84 to zoom to)
+    :param folder: output folder
+    :return: (image name, seconds, error message or None)
+    """
+    start = time.perf_counter()
+    try:
+        plot, map = secondary.plot_states()
+        bbox = job.get("bbox")
+        if job.get("points"):
+            secondary.add_points(plot, map, job["points"])
+        if job.get("all"):
+            secondary.add_all_points(plot, map, bbox=bbox)
+        if bbox:
+            # zoom to the projected bounds after drawing, basemap resets the limits when it draws
+            # the bounds of a lcc projected box are at its corners
+            x, y = map([bbox[0], bbox[0], bbox[2], bbox[2]], [bbox[1], bbox[3], bbox[1], bbox[3]])
+            ax = plot.gca()
+            ax.set_xlim(min(x), max(x))
+            ax.set_ylim(min(y), max(y))
+        secondary.show_save_plot(plot, job["name"], folder, show=False)
+        return job["name"], time.perf_counter() - start, None
+    except Exception as e:
+        plt.close("all")
+        return job["name"], time.perf_counter() - start, str(e)
+
+
+def _export(args):
+    """ unpack the arguments of export, used by the pool """
+    return export(*args)
+
+
+def render(jobs, workers=settings.EXPORT_WORKERS, folder=None):
+    """
+    Export a list of maps with a pool of processes
+    :param jobs: iterable of jobs, see export
+    :param workers: number of processes, if None one for each cpu
+    :param folder: output folder, if None use get_folder()
+    :return: a dictionary with the number of images, errors, seconds and images per second
+    """
+    if not folder:
+        folder = get_folder()
+
+    # fill the disk cache once, so that the workers only read it
+    secondary.get_states_xy(secondary.get_basemap())
+
+    start = time.perf_counter()
+    pool = multiprocessing.Pool(workers, initializer=init_worker)
+    try:
+        results = list(pool.imap_unordered(_export, ((job, folder) for job in jobs)))
+    finally:
+        pool.close()
+        pool.join()
+    total = time.perf_counter() - start
+
+    errors = [r for r in results if r[2]]
+    for name, seconds, error in errors:
+        print(name + ": " + error)
+    images = len(results) - len(errors)
+    return {"images": images, "errors": len(errors), "seconds": total,
+            "images per second": images / total if total else 0}
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) < 2 or sys.argv[1] not in JOBS:
+        print("usage: python plotexport.py " + "|".join(sorted(JOBS)) + " [workers]")
+        sys.exit(1)
+
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else settings.EXPORT_WORKERS
+    print("Exporting " + sys.argv[1] + "...")
+    result = render(JOBS[sys.argv[1]](), workers)
+    print("{images} images in {seconds:.1f} s, {images per second:.2f} images/s, {errors} errors".format(**result))
+    print("images saved in " + get_folder())
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name:        renderfarm.py
+# Purpose:     render many map images with a pool of headless browsers,
+#               each browser loads the map page once and is reused for all its jobs
+#               run as "python renderfarm.py bookmarks|states [workers]"
+#
+# Author:      claudio piccinini
+#
+# Updated:     18/10/2026
+#-------------------------------------------------------------------------------
+import os
+import sys
+import time
+import queue
+import threading
+
+from psycopg2.extensions import AsIs
+
+import utils
+import settings
+import bookmarks
+import main
+import imagewriter
+
+
+def get_folder():
+    """
+    Return the output folder, it is created if not existing
+    :return: path to the folder
+    """
+    folder = settings.FARM_FOLDER
+    if not folder:
+        folder = os.path.dirname(os.path.abspath(__file__)) + "/renders"
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    return folder
+
+
+def bookmark_jobs(zoom=settings.FARM_ZOOM, bbox=None):
+    """
+    One job for each bookmark, the map is centered on the bookmark and shows only that bookmark
+    :param zoom: map zoom
+    :param bbox: (minlon, minlat, maxlon, maxlat) WGS84 of the bookmarks, if None all the bookmarks
+    :return: a generator of jobs
+    """
+    for id, lon, lat, label, size in bookmarks.iter_bookmarks(bbox):
+        yield {"name": "bookmark_" + str(id) + ".jpeg", "center": [lat, lon], "zoom": zoom,
+               "points": [(lon, lat, size, label)]}
+
+
+def state_jobs():
+    """
+    One job for each state, the map is fitted to the state bounds
+    :return: a list of jobs
+    """
+    with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+        cur.execute("""SELECT name, ST_YMin(geom), ST_XMin(geom), ST_YMax(geom), ST_XMax(geom) FROM %s ORDER BY name""",
+                    (AsIs(settings.STATES_TABLE_NAME),))
+        rows = cur.fetchall()
+    return [{"name": r[0] + ".jpeg", "bounds": [[r[1], r[2]], [r[3], r[4]]], "points": []} for r in rows]
+
+
+def set_view(driver, mapname, job):
+    """
+    Move the map to the job view and wait for the tiles to be loaded
+    :param driver: the selenium driver
+    :param mapname: the name of the folium map in the page
+    :param job: the job
+    :return: None
+    """
+    if "bounds" in job:
+        driver.execute_script("window[arguments[0]].fitBounds(arguments[1], {animate: false});", mapname, job["bounds"])
+    else:
+        driver.execute_script("window[arguments[0]].setView(arguments[1], arguments[2], {animate: false});",
+                              mapname, job["center"], job["zoom"])
+
+    # wait until no tile layer is loading
+    deadline = time.time() + settings.FARM_TIMEOUT
+    while time.time() < deadline:
+        loading = driver.execute_script("""
+            var loading = false;
+            window[arguments[0]].eachLayer(function(layer) { if (layer._loading) { loading = true; } });
+            return loading;""", mapname)
+        if not loading:
+            return
+        time.sleep(0.05)
+
+
+def worker(path, mapname, jobs, folder, stats, lock):
+    """
+    Render jobs from a queue with one headless browser until the queue is empty
+    :param path: the path to the map page
+    :param mapname: the name of the folium map in the page
+    :param jobs: a queue of jobs
+    :param folder: output folder
+    :param stats: a list where the worker appends (job name, seconds, error)
+    :param lock: lock protecting stats
+    :return: None
+    """
+    driver = None
+    try:
+        driver = main.browser(path, settings.BROWSER, headless=True, size=settings.MAP_SIZE)
+        while True:
+            try:
+                job = jobs.get_nowait()
+            except queue.Empty:
+                break
+            start = time.perf_counter()
+            error = None
+            try:
+                main.push_points(driver, mapname, job["points"], clear=True)
+                set_view(driver, mapname, job)
+                main.save_image(driver, job["name"], folder)
+            except Exception as e:
+                error = str(e)
+            with lock:
+                stats.append((job["name"], time.perf_counter() - start, error))
+    finally:
+        if driver: driver.quit()
+
+
+def render(jobs, workers=settings.FARM_WORKERS, folder=None):
+    """
+    Render a list of map views with a pool of headless browsers, images are written as save_image does
+    and the function returns when all of them are on disk
+    :param jobs: iterable of jobs, a job is a dictionary with "name" (image name), "points" (list of (x, y, size, label)
+     bookmarks to show) and either "center" ([lat, lon]) and "zoom", or "bounds" ([[minlat, minlon], [maxlat, maxlon]])
+    :param workers: number of browsers
+    :param folder: output folder, if None use get_folder()
+    :return: a dictionary with the number of images, errors, seconds and images per second
+    """
+    if not folder:
+        folder = get_folder()
+
+    # the page is written once with full resolution states, every browser loads it once
+    map = main.states_map(settings.MAP_ZOOM, None, folder)
+    path = main.save_map(map, name="render.html", folder=folder)
+    mapname = map.get_name()
+
+    todo = queue.Queue()
+    for job in jobs:
+        todo.put(job)
+
+    stats = []
+    lock = threading.Lock()
+    threads = [threading.Thread(target=worker, args=(path, mapname, todo, folder, stats, lock))
+               for i in range(min(workers, todo.qsize()))]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # the images still in the writer queue are part of the work
+    written = imagewriter.flush()
+    total = time.perf_counter() - start
+
+    errors = [s for s in stats if s[2]]
+    for name, seconds, error in errors:
+        print(name + ": " + error)
+    images = len(stats) - len(errors) - len(written)
+    return {"images": images, "errors": len(errors) + len(written), "seconds": total,
+            "images per second": images / total if total else 0}
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ("bookmarks", "states"):
+        print("usage: python renderfarm.py bookmarks|states [workers]")
+        sys.exit(1)
+
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else settings.FARM_WORKERS
+    jobs = bookmark_jobs() if sys.argv[1] == "bookmarks" else state_jobs()
+    print("Rendering " + sys.argv[1] + " with " + str(workers) + " browsers...")
+    result = render(jobs, workers)
+    print("{images} images in {seconds:.1f} s, {images per second:.2f} images/s, {errors} errors".format(**result))
+    print("images saved in " + get_folder())
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name:        reproject.py
+# Purpose:     reproject the features of a vector layer a chunk at a time, the coordinates of all the geometries
+#               of a chunk are read from their wkb into one numpy array and transformed with one pyproj call,
+#               then written back in place; features are streamed to the COPY loader or to an output file
+#
+# Author:      claudio piccinini
+#
+# Updated:     18/10/2026
+#-------------------------------------------------------------------------------
+
+import os
+import shutil
+import struct
+import tempfile
+
+import numpy as np
+import pyproj
+from osgeo import ogr
+from osgeo import osr
+
+import settings
+
+
+# wkb geometry type codes
+POINT, LINESTRING, POLYGON = 1, 2, 3
+COLLECTIONS = (4, 5, 6, 7)  # multipoint, multilinestring, multipolygon, geometrycollection
+WKB_25D = 0x80000000
+
+
+def get_transformer(source, epsg_to):
+    """
+    Return a function transforming numpy arrays of coordinates, x is always longitude or easting
+    :param source: an osr.SpatialReference or an epsg code
+    :param epsg_to: the output epsg code
+    :return: a function (x, y) -> (x, y)
+    """
+    if hasattr(pyproj, "Transformer"):
+        # pyproj 2 and later
+        if isinstance(source, int):
+            crs = pyproj.CRS.from_epsg(source)
+        else:
+            crs = pyproj.CRS.from_wkt(source.ExportToWkt())
+        return pyproj.Transformer.from_crs(crs, pyproj.CRS.from_epsg(epsg_to), always_xy=True).transform
+
+    # pyproj 1.9, degrees are converted to radians by pyproj.transform
+    if isinstance(source, int):
+        projfrom = pyproj.Proj(init="epsg:" + str(source))
+    else:
+        projfrom = pyproj.Proj(source.ExportToProj4())
+    projto = pyproj.Proj(init="epsg:" + str(epsg_to))
+    return lambda x, y: pyproj.transform(projfrom, projto, x, y)
+
+
+def get_layer_transformer(layer, epsg_to, epsg_from=None):
+    """
+    Return the transformer from the coordinate system of a layer
+    :param layer: an OGR layer
+    :param epsg_to: the output epsg code
+    :param epsg_from: the input epsg code, if None use the layer coordinate system
+    :return: a function (x, y) -> (x, y), None if the layer is already in epsg_to or has no coordinate system
+    """
+    if epsg_from:
+        return None if int(epsg_from) == int(epsg_to) else get_transformer(int(epsg_from), epsg_to)
+    srs = layer.GetSpatialRef()
+    if srs is None:
+        return None
+    srs = srs.Clone()
+    srs.AutoIdentifyEPSG()
+    if srs.GetAuthorityCode(None) == str(epsg_to):
+        return None
+    return get_transformer(srs, epsg_to)
+
+
+def read_blocks(wkb, offset, blocks):
+    """
+    Find the coordinate arrays of a little endian wkb geometry
+    :param wkb: the wkb
+    :param offset: position of the geometry in the wkb
+    :param blocks: list, (offset, number of points, number of dimensions) of each coordinate array is appended
+    :return: the position after the geometry
+    """
+    wkbtype, = struct.unpack_from("<I", wkb, offset + 1)
+    dims = 2
+    if wkbtype & WKB_25D:
+        dims, wkbtype = 3, wkbtype & 0xff
+    elif wkbtype > 1000:
+        # iso wkb, 1000 Z, 2000 M, 3000 ZM
+        dims, wkbtype = (3, 3, 4)[wkbtype // 1000 - 1], wkbtype % 1000
+    offset += 5
+
+    if wkbtype == POINT:
+        blocks.append((offset, 1, dims))
+        return offset + 8 * dims
+    count, = struct.unpack_from("<I", wkb, offset)
+    offset += 4
+    if wkbtype == LINESTRING:
+        blocks.append((offset, count, dims))
+        return offset + 8 * dims * count
+    if wkbtype == POLYGON:
+        for i in range(count):
+            points, = struct.unpack_from("<I", wkb, offset)
+            blocks.append((offset + 4, points, dims))
+            offset += 4 + 8 * dims * points
+        return offset
+    if wkbtype in COLLECTIONS:
+        for i in range(count):
+            offset = read_blocks(wkb, offset, blocks)
+        return offset
+    raise Exception("geometry type " + str(wkbtype) + " cannot be reprojected")
+
+
+def transform_wkbs(wkbs, transformer):
+    """
+    Reproject little endian wkb geometries in place, with one transformation for all their coordinates;
+    z and m values are not changed
+    :param wkbs: list of bytearray
+    :param transformer: a function (x, y) -> (x, y), see get_transformer
+    :return: None
+    """
+    views = []
+    for wkb in wkbs:
+        blocks = []
+        read_blocks(wkb, 0, blocks)
+        for offset, points, dims in blocks:
+            # a writable view of the bytearray, no copy
+            views.append(np.frombuffer(wkb, "<f8", points * dims, offset).reshape(points, dims))
+    if not views:
+        return
+
+    xy = np.concatenate([v[:, :2] for v in views])
+    x, y = transformer(xy[:, 0], xy[:, 1])
+    start = 0
+    for v in views:
+        end = start + len(v)
+        v[:, 0] = x[start:end]
+        v[:, 1] = y[start:end]
+        start = end
+
+
+def reproject_features(features, transformer):
+    """
+    Reproject the geometries of a list of features, the geometries are rebuilt from the transformed wkb
+    :param features: list of OGR features
+    :param transformer: a function (x, y) -> (x, y), see get_transformer
+    :return: the features
+    """
+    wkbs = []
+    for feature in features:
+        geom = feature.GetGeometryRef()
+        wkbs.append(None if geom is None else bytearray(geom.ExportToWkb(ogr.wkbNDR)))
+    transform_wkbs([w for w in wkbs if w is not None], transformer)
+    for feature, wkb in zip(features, wkbs):
+        if wkb is not None:
+            feature.SetGeometryDirectly(ogr.CreateGeometryFromWkb(bytes(wkb)))
+    return features
+
+
+def iter_reprojected(features, transformer, chunksize=settings.REPROJECT_CHUNK):
+    """
+    Reproject features a chunk at a time while they are read
+    :param features: an iterable of OGR features
+    :param transformer: a function (x, y) -> (x, y), see get_transformer
+    :param chunksize: number of features transformed together
+    :return: a generator of the reprojected features
+    """
+    chunk = []
+    for feature in features:
+        chunk.append(feature)
+        if len(chunk) == chunksize:
+            yield from reproject_features(chunk, transformer)
+            chunk = []
+    if chunk:
+        yield from reproject_features(chunk, transformer)
+
+
+def reproject_file(path, outpath, epsg_to, epsg_from=None, driver=None, chunksize=settings.REPROJECT_CHUNK):
+    """
+    Reproject the first layer of a vector file to a new file, features are written while they are read;
+    outpath can be the input file, the output is then written to a temporary folder and moved at the end
+    :param path: the input file, GDAL virtual paths such as /vsizip/ can be used
+    :param outpath: the output file, a file existing with the same name is replaced
+    :param epsg_to: the output epsg code
+    :param epsg_from: the input epsg code, if None use the layer coordinate system
+    :param driver: name of the output driver, if None use the input driver
+    :param chunksize: number of features transformed together
+    :return: number of features written
+    """
+    inDataSet = ogr.Open(path, 0)
+    if inDataSet is None:
+        raise Exception("cannot open " + path)
+    outDataSet = None
+    folder = os.path.dirname(os.path.abspath(outpath))
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    temp = tempfile.mkdtemp(dir=folder)
+    try:
+        inLayer = inDataSet.GetLayer()
+        drv = ogr.GetDriverByName(driver) if driver else inDataSet.GetDriver()
+        outSpatialRef = osr.SpatialReference()
+        outSpatialRef.ImportFromEPSG(epsg_to)
+
+        outDataSet = drv.CreateDataSource(temp + "/" + os.path.basename(outpath))
+        outLayer = outDataSet.CreateLayer(inLayer.GetName(), srs=outSpatialRef, geom_type=inLayer.GetGeomType())
+        inLayerDefn = inLayer.GetLayerDefn()
+        for i in range(inLayerDefn.GetFieldCount()):
+            outLayer.CreateField(inLayerDefn.GetFieldDefn(i))
+        outLayerDefn = outLayer.GetLayerDefn()
+
+        features = iter(inLayer.GetNextFeature, None)
+        transformer = get_layer_transformer(inLayer, epsg_to, epsg_from)
+        if transformer is not None:
+            features = iter_reprojected(features, transformer, chunksize)
+        count = 0
+        for feature in features:
+            outFeature = ogr.Feature(outLayerDefn)
+            # fields and geometry are copied in one call
+            outFeature.SetFrom(feature)
+            outLayer.CreateFeature(outFeature)
+            count += 1
+        outDataSet = None  # close the file
+
+        inDataSet = None  # outpath can be the input file
+        if os.path.exists(outpath):
+            drv.DeleteDataSource(outpath)
+        for name in os.listdir(temp):
+            os.replace(temp + "/" + name, folder + "/" + name)
+        return count
+    finally:
+        outDataSet = None
+        inDataSet = None
+        shutil.rmtree(temp, ignore_errors=True)
@@ -10,30 +10,49 @@
 #
 # Updated:     07/10/2017
 #-------------------------------------------------------------------------------
-import urllib.request
-import urllib.error
 import os
 import shutil
 import zipfile
+import json
+import hashlib
 
-import shapefile
 from psycopg2.extensions import AsIs
 from osgeo import ogr
 from osgeo import osr
 from shapely.wkb import loads
-from numpy import asarray
+import numpy as np
 from mpl_toolkits.basemap import Basemap
-from matplotlib.patches import Polygon
-from matplotlib.collections import PatchCollection
+from matplotlib.collections import PolyCollection
 import matplotlib.pyplot as plt
 
 import settings
+import shapeheader
+import shapeload
+import reproject
+import download
 import utils
+import containment
+import bookmarks
+import geocache
+
+
+# projection of the maps
+PROJECTION = dict(projection='lcc', urcrnrlat=47.7, llcrnrlat=23.08, urcrnrlon=-62.5,
+                  llcrnrlon=-120, lon_0=-98.7, lat_0=39, lat_1=33, lat_2=45)
+
+# global variables to store the basemap and the projected states
+BASEMAP = None
+STATES_XY = None
+
+# insert a bookmark and build its geometry in the same statement, parameters are lat, lon, label, size, state
+INSERT_BOOKMARK = """INSERT INTO """ + settings.BOOKMARKS_TABLE_NAME + """(lat, lon, label, size, state, geom)
+                     VALUES ($1, $2, $3, $4, $5, ST_SetSRID(ST_MakePoint($2, $1), 4326)) RETURNING id"""
 
 
 def download_zip(url, folder=None):
     """
-    This function will download a zip file to disk
+    This function will download a zip file to disk, a file downloaded before is downloaded again only if it changed,
+    a partial download is resumed, the mirrors in settings.DOWNLOAD_MIRRORS are tried if the url does not work
     :param url:
     :param folder: a folder to save the file, if None will download to this script folder
     :return: a tuple with path to folder and the filename
@@ -46,22 +65,21 @@ def download_zip(url, folder=None):
 
     # Download the file from "url" and save it locally under "file_name":
     try:
-        with urllib.request.urlopen(url) as response, open(folder + "/" + file_name, 'wb') as out_file:
-            shutil.copyfileobj(response, out_file)
-    except urllib.error.URLError as e:
-        print('urllib.error.URLError')
-        raise Exception(e)
+        used, status = download.fetch(download.get_urls(url), folder + "/" + file_name,
+                                      settings.DOWNLOAD_CHECKSUMS.get(file_name))
+        print(file_name + " " + status + " from " + used)
     except Exception as e:
         raise Exception(e)
     else:
         return folder,file_name
 
 
-def unzip(folder, file_name):
+def unzip(folder, file_name, members=None):
     """
-    Unzip a .zip
+    Unzip a .zip, each file is copied to disk a chunk at a time and is never read in memory as a whole
     :param folder: the path to the folder with the zip file
     :param file_name: the zip file name
+    :param members: list of the names of the files to unzip, if None unzip all the files
     :return: the folder name of the folder with the extracted files
     """
 
@@ -69,25 +87,21 @@ def unzip(folder, file_name):
     if not os.path.exists(folder + "/" + base):  #create a new directory if not existing
        os.mkdir(folder + "/" + base)
 
-    z = None
-    zipShape = None
     try:
-       z = open(folder + "/" + file_name,"rb")
-       zipShape = zipfile.ZipFile(z)
-
-       #print (zipShape.namelist()) #list the zip content
-       for fileName in zipShape.namelist():  #unzip files
-            out = open(folder + "/" + base+'/'+fileName, "wb")
-            out.write(zipShape.read(fileName))
-            out.close()
+       with zipfile.ZipFile(folder + "/" + file_name) as zipShape:
+           #print (zipShape.namelist()) #list the zip content
+           for fileName in zipShape.namelist():  #unzip files
+                if fileName.endswith("/") or (members is not None and fileName not in members):
+                    continue
+                # files are written in the folder, paths inside the zip are ignored
+                with zipShape.open(fileName) as source, \
+                        open(folder + "/" + base + '/' + os.path.basename(fileName), "wb") as out:
+                    shutil.copyfileobj(source, out, settings.UNZIP_CHUNK)
 
     except Exception as e:
         raise Exception(e)
     else:
         return base
-    finally:
-       if zipShape: zipShape.close()
-       if z: z.close()
 
 
 def check_shapefile(folder):
@@ -127,10 +141,9 @@ def check_shapefile(folder):
         if len(file) > 1:
             raise Exception("zip file should contain only 1 shapefile ")
 
-        # check this is a polygon shapefile
-        sf = shapefile.Reader(folder + "/" + file[0])
-        shapes = sf.shapes()
-        if shapes[0].shapeType not in [5, 15, 25]:  # check polygon shapetypes
+        # check this is a polygon shapefile, only the file headers and a sample of records are read
+        info = shapeheader.check_files(folder + "/" + file[0] + ".shp")
+        if info["shapetype"] not in shapeheader.POLYGON_TYPES:  # check polygon shapetypes
             raise Exception("shapefile should be polygon")
 
         return file[0]+".shp"
@@ -146,98 +159,134 @@ def check_table(schemaname=settings.DEFAULT_SCHEMA, tablename=settings.STATES):
     :return: True if table exists otherwise False
     """
 
-    conn = None
-    cur = None
-
     try:
 
-        conn = utils.pgconnect(**settings.DEFAULT_CONNECTION)
-        cur = conn.cursor()
-        cur.execute("""SELECT to_regclass('%s.%s');""", (AsIs(schemaname), AsIs(tablename)))
-        result = cur.fetchone()[0]
+        with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+            cur.execute("""SELECT to_regclass('%s.%s');""", (AsIs(schemaname), AsIs(tablename)))
+            result = cur.fetchone()[0]
 
         return (True if result else False)
 
     except Exception as e:
         raise Exception(e)
 
-    finally:
-        if conn: conn = None
-        if cur: cur = None
-
 
 def upload_shape(shapepath):
     """
     Upload file to database
-    :param shapepath: path to the shapefile
+    :param shapepath: path to the shapefile, with the copy loader it can be a GDAL virtual path such as /vsizip/
     :return: None
     """
 
-    conn = None
-    cur = None
-
-    try:
-        # first create the sqlstring with inserts
-        # call PGSQL2SHP with some parameters, -s 4326 to set lat/lon srid, -I to create a spatial index on the geometry column
-        params = [settings.SHP2PGSQL, "-s", "4326", "-I", shapepath, settings.STATES_TABLE_NAME]
-        sqlstring,info = utils.run_tool(params)
-        if not sqlstring:
-            raise Exception("cannot upload file to database")
-
-        #then use the sqlstring
-        conn = utils.pgconnect(**settings.DEFAULT_CONNECTION)
-        cur = conn.cursor()
-        cur.execute(sqlstring)
+    with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+        if settings.SHAPE_LOADER == "copy":
+            # features are streamed to the table with a binary COPY, then the spatial index is created
+            if shapeload.count_features(shapepath) >= settings.INGEST_PARALLEL_MIN:
+                # big layers are loaded in chunks by a pool of processes, each with its own connection
+                shapeload.parallel_load(shapepath, settings.STATES_TABLE_NAME, 4326)
+            else:
+                shapeload.load(cur, shapepath, settings.STATES_TABLE_NAME, 4326)
+        else:
+            # first create the sqlstring with inserts
+            # call PGSQL2SHP with some parameters, -s 4326 to set lat/lon srid, -I to create a spatial index on the geometry column
+            params = [settings.SHP2PGSQL, "-s", "4326", "-I", shapepath, settings.STATES_TABLE_NAME]
+            sqlstring,info = utils.run_tool(params)
+            if not sqlstring:
+                raise Exception("cannot upload file to database")
+            #then use the sqlstring
+            cur.execute(sqlstring)
+        # split the states in small pieces for the point checks
+        containment.build_subdivided(cur)
+        # simplify the states for the web map, main.py reads them
+        containment.build_simplified(cur)
         conn.commit()
 
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
+    # the states changed, the in memory index and the projected states must be loaded again
+    containment.invalidate()
+    invalidate_states()
+
+
+def get_basemap():
+    """
+    Return the basemap, it is made on first use
+    :return: the basemap
+    """
+    global BASEMAP
+    if BASEMAP is None:
+        BASEMAP = Basemap(resolution='l', **PROJECTION)
+    return BASEMAP
+
+
+def get_states_xy(map):
+    """
+    Return the vertices of the states polygons projected with the basemap, they are read from the disk cache
+    when the states table did not change, otherwise from the database
+    :param map: the basemap
+    :return: (xy, offsets), xy is an array with the vertices of all the polygons,
+     the vertices of polygon i are xy[offsets[i]:offsets[i+1]]
+    """
+    global STATES_XY
+    if STATES_XY is not None: return STATES_XY
+
+    # the cached vertices depend on the projection too
+    name = "states_xy_" + hashlib.md5(json.dumps(PROJECTION, sort_keys=True).encode("utf-8")).hexdigest()[:8]
+
+    with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+        version = geocache.fingerprint(cur)
+        arrays = geocache.load_arrays(name, version)
+        if arrays is None:
+            cur.execute("""SELECT ST_AsBinary(geom) FROM %s WHERE geom IS NOT NULL ORDER BY gid""",
+                        (AsIs(settings.STATES_TABLE_NAME),))
+            rings = []
+            for row in cur:
+                geom = loads(bytes(row[0]))
+                for polygon in getattr(geom, "geoms", [geom]):
+                    rings.append(np.asarray(polygon.exterior.coords)[:, :2])
+            # project all the vertices at once
+            lonlat = np.concatenate(rings)
+            x, y = map(lonlat[:, 0], lonlat[:, 1])
+            arrays = {"xy": np.column_stack([x, y]), "offsets": np.cumsum([0] + [len(r) for r in rings])}
+            geocache.save_arrays(name, version, **arrays)
+
+    STATES_XY = arrays["xy"], arrays["offsets"]
+    return STATES_XY
+
+
+def invalidate_states():
+    """
+    Forget the projected states in memory and on disk, call it when the states table changes
+    :return: None
+    """
+    global STATES_XY
+    STATES_XY = None
+    geocache.invalidate()
 
 
 def plot_states():
     """
-    Plot the states
+    Plot the states, the basemap and the projected states are made once and reused
     :return: plot and map objects
     """
 
     fig = plt.figure(num=None, figsize=(11.3, 7.00))
     ax = plt.axes([0, 0, 1, 1], facecolor=(0.4471, 0.6235, 0.8117))
-    map = Basemap(projection='lcc', urcrnrlat=47.7, llcrnrlat=23.08, urcrnrlon=-62.5,
-                  llcrnrlon=-120, lon_0=-98.7, lat_0=39, lat_1=33, lat_2=45,
-                  resolution='l')
-    map.fillcontinents(color='0.7', zorder=0)
-
-    source = ogr.Open("PG:host="+settings.DEFAULT_CONNECTION["host"]+" dbname="+settings.DEFAULT_CONNECTION["dbname"] +
-                      " user="+settings.DEFAULT_CONNECTION["user"]+" password="+settings.DEFAULT_CONNECTION["password"])
-    data = source.ExecuteSQL("select geom from " + settings.STATES_TABLE_NAME)
-
-    patches = []
-    while True:
-        feature = data.GetNextFeature()
-        if not feature:
-            break
-        geom = loads(feature.GetGeometryRef().ExportToWkb())
-        for polygon in geom:
-            a = asarray(polygon.exterior)
-            x, y = map(a[:, 0], a[:, 1])
-            a = zip(x, y)
-            p = Polygon(list(a), fc="y", ec='k', alpha=0.2, zorder=2, lw=.1)
-            patches.append(p)
+    map = get_basemap()
+    map.fillcontinents(color='0.7', zorder=0, ax=ax)
 
-    ax.add_collection(PatchCollection(patches, match_original=True))
+    xy, offsets = get_states_xy(map)
+    polygons = np.split(xy, offsets[1:-1])
+    ax.add_collection(PolyCollection(polygons, facecolors="y", edgecolors='k', alpha=0.2, zorder=2, linewidths=.1))
 
     return plt, map
 
 
-def show_save_plot(plt, name="states.jpg", folder=None):
+def show_save_plot(plt, name="states.jpg", folder=None, show=True):
     """
     Show matplotlib plot on screen and save it to disk
     :param plt: matplotlib plot object
     :param name: name for the output image
     :param folder: output folder
+    :param show: if False only save the image and close the figure, no window is needed
     :return:
     """
 
@@ -245,7 +294,10 @@ def show_save_plot(plt, name="states.jpg", folder=None):
     if not folder:
         folder = os.path.dirname(os.path.abspath(__file__))
     fig.savefig(folder + '/' + name, dpi=200)
-    plt.show()
+    if show:
+        plt.show()
+    else:
+        plt.close(fig)
 
 
 def add_point(plt, map, x, y, size, label, sizemult=2):
@@ -260,44 +312,115 @@ def add_point(plt, map, x, y, size, label, sizemult=2):
     return plt
 
 
-def add_all_points(plt,map, sizemult=3):
+def add_points(plt, map, points, sizemult=3, vectorized=True):
     """
-    Add all the points to the map
+    Add points to the map
     :param plt: a matplotlib plot object
     :param map: a matplotlib map object
+    :param points: iterable of (x, y, size, label), x and y WGS84
     :param sizemult: multiplier to scale the marker size
-    :return:
+    :param vectorized: if True project all the points at once and draw them with one scatter call,
+     otherwise draw each point with its own plot call
+    :return: number of points added
     """
 
-    conn = None
-    curr = None
+    if not vectorized:
+        count = 0
+        for x, y, size, label in points:
+            add_point(plt, map, x, y, size, label, sizemult)
+            count += 1
+        return count
 
-    try:
-        conn = utils.pgconnect(**settings.DEFAULT_CONNECTION)
-        cur = conn.cursor()
-        # if the point is inside this will return (True,) otherwise None
-        cur.execute("""select lon, lat, label,size from %s""", (AsIs(settings.BOOKMARKS_TABLE_NAME),))
+    points = list(points)
+    if not points:
+        return 0
 
-        result = cur.fetchall()
+    x = np.fromiter((p[0] for p in points), dtype=float, count=len(points))
+    y = np.fromiter((p[1] for p in points), dtype=float, count=len(points))
+    size = np.fromiter((p[2] for p in points), dtype=float, count=len(points))
+    x_, y_ = map(x, y)
+
+    # scatter sizes are areas, plot sizes are widths
+    map.scatter(x_, y_, s=(size * sizemult) ** 2, marker="*", c="r", linewidths=0, zorder=3)
+    add_labels(plt, x_, y_, [p[3] for p in points], size)
+    return len(points)
 
-        #iterate and add point
-        for rs in result:
 
-            x_, y_ = map(rs[0], rs[1])
+def add_labels(plt, x, y, labels, size, maxlabels=settings.PLOT_LABELS_MAX):
+    """
+    Add the labels of many points, every label is drawn unless there are more than maxlabels labels:
+    then a label on top of another label is not drawn, at most maxlabels labels of the biggest points are drawn
+    and the number of labels not drawn is printed
+    :param plt: a matplotlib plot object
+    :param x: numpy array of projected x
+    :param y: numpy array of projected y
+    :param labels: list of labels
+    :param size: numpy array of point sizes
+    :param maxlabels: number of labels above which labels are skipped, if None draw every label
+    :return: number of labels added
+    """
+    ax = plt.gca()
+    todo = [i for i in np.argsort(-size, kind="mergesort") if labels[i]]
+
+    if maxlabels is None or len(todo) <= maxlabels:
+        for i in todo:
+            ax.text(x[i], y[i], labels[i], fontsize=8, fontweight='bold', ha='center', va='bottom', color='k',
+                    clip_on=True)
+        return len(todo)
+
+    # cells of about one label size in map units, one label for each cell
+    cellx = (ax.get_xlim()[1] - ax.get_xlim()[0]) / 40.
+    celly = (ax.get_ylim()[1] - ax.get_ylim()[0]) / 60.
+    seen = set()
+    count = 0
+    for i in todo:
+        cell = (int(x[i] // cellx), int(y[i] // celly))
+        if cell in seen: continue
+        seen.add(cell)
+        ax.text(x[i], y[i], labels[i], fontsize=8, fontweight='bold', ha='center', va='bottom', color='k', clip_on=True)
+        count += 1
+        if count == maxlabels: break
+    print(str(len(todo) - count) + " of " + str(len(todo)) + " labels not drawn, they are more than PLOT_LABELS_MAX")
+    return count
+
+
+def add_all_points(plt,map, sizemult=3, bbox=None, limit=None, vectorized=True):
+    """
+    Add all the points inside the map extent to the map
+    :param plt: a matplotlib plot object
+    :param map: a matplotlib map object
+    :param sizemult: multiplier to scale the marker size
+    :param bbox: (minlon, minlat, maxlon, maxlat) WGS84 of the points to add, if None use the map extent
+    :param limit: maximum number of points, None for no limit
+    :param vectorized: if True draw all the points at once, see add_points
+    :return:
+    """
 
-            if rs[2]:
-                plt.text(x_, y_, rs[2], fontsize=8, fontweight='bold',
-                     ha='center', va='bottom', color='k')
-            map.plot(x_, y_, "r*", markersize=rs[3]*sizemult)
+    if bbox is None:
+        bbox = get_bbox(map)
 
+    try:
+        #the points are read a page at a time
+        points = ((rs[1], rs[2], rs[4], rs[3]) for rs in bookmarks.iter_bookmarks(bbox, limit=limit))
+        add_points(plt, map, points, sizemult, vectorized)
         return plt
 
     except Exception as e:
         raise Exception(e)
 
-    finally:
-        if cur: cur = None
-        if conn: conn = None
+
+def get_bbox(map):
+    """
+    Return the WGS84 bounding box of a basemap
+    :param map: a matplotlib map object
+    :return: (minlon, minlat, maxlon, maxlat)
+    """
+    # the map edges are curved lines in lon/lat, take the bounds of points along them
+    x = [map.xmin + (map.xmax - map.xmin) * i / 20. for i in range(21)]
+    y = [map.ymin + (map.ymax - map.ymin) * i / 20. for i in range(21)]
+    edges = [(i, map.ymin) for i in x] + [(i, map.ymax) for i in x] + [(map.xmin, j) for j in y] + [(map.xmax, j) for j in y]
+    lons, lats = map([e[0] for e in edges], [e[1] for e in edges], inverse=True)
+    return min(lons), min(lats), max(lons), max(lats)
 
 
 def upload_point(x, y, label=""):
@@ -307,89 +430,75 @@ def upload_point(x, y, label=""):
     :param x: point longitude (wgs84) as string
     :param y: point latitude (wgs84) as string
     :param label: point label
-    :return: ("longitude","latitude", size) ; coordinates are cropped to 4 decimal digits, size will be the bookmark size
+    :return: ("longitude","latitude", size, id) ; coordinates are cropped to 4 decimal digits, size will be the bookmark size,
+     id is the new bookmark id
     """
 
-    conn = None
-    cur = None
-
     try:
-        # check the point is inside the usa, both point and states must be WGS84
-        conn = utils.pgconnect(**settings.DEFAULT_CONNECTION)
-        cur = conn.cursor()
-        #if the point is inside this will return (True,) otherwise None
-        cur.execute("""select result from
-                        (select st_contains(s.geom,ST_GeomFromText('POINT(%s %s)', 4326)) as result 
-                          from %s as s) as subquery
-                          where result is true""",(AsIs(x),AsIs(y), AsIs(settings.STATES_TABLE_NAME)))
-
-        result = cur.fetchone()
-        #print(result)
-
-        if result: # if result is not None
-
-            #check numbers size, crop to 4 digits, define the marker size
-
-            # size symbol
-            size=None
-
-            # store number of decimal digits
-            lx = 0
-            ly = 0
-
-            # convert numbers to string
-            #x = str(x);y = str(y)
-
-            if ',' in x or ',' in y:
-                raise Exception("decimal numbers should not contain ','")
-
-            # check the number of decimal digits and crop to 4
-            if '.' in x:  # do only for float number
-                lx = len(x.split('.')[1])  # get decimals
-                if lx > 4:  # crop size to 4
-                    x = x[:(4 - lx)]
-                    lx = 4
-            if '.' in y:  # do only for float number
-                ly = len(y.split('.')[1])
-                if ly > 4:
-                    y = y[:(4 - ly)]
-                    ly = 4
-
-            # select a symbol size according
-            # for the size take the bigger number of digits of the two numbers
-            ndigits = max([lx, ly])
-            if ndigits == 0:
-                size = 5
-            elif ndigits == 1:
-                size = 4
-            elif ndigits == 2:
-                size = 3
-            elif ndigits == 3:
-                size = 2
-            elif ndigits == 4:
-                size = 1
-
-            #upload to database
-            cur.execute(
-                    """INSERT INTO %s(lat,lon,label,size) VALUES (%s,%s,%s,%s) RETURNING id""",
-                        (AsIs(settings.BOOKMARKS_TABLE_NAME), y, x, label, size))
-            #id = cur.fetchone()[0]
-            #print(id)
-            cur.execute("""UPDATE %s SET geom = ST_PointFromText('POINT(' || lon || ' ' || lat || ')', 4326)""",(AsIs(settings.BOOKMARKS_TABLE_NAME),))
-            conn.commit()
-
-        else:
-            raise Exception("the point is not inside USA")
+        with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+            # check the point is inside the usa, both point and states must be WGS84
+            # the in memory states index is used if available, otherwise PostGIS
+            # this will return the state name, otherwise None
+            state = containment.locate(cur, float(x), float(y))
+
+            if state: # if state is not None
+
+                #check numbers size, crop to 4 digits, define the marker size
+
+                # size symbol
+                size=None
+
+                # store number of decimal digits
+                lx = 0
+                ly = 0
+
+                # convert numbers to string
+                #x = str(x);y = str(y)
+
+                if ',' in x or ',' in y:
+                    raise Exception("decimal numbers should not contain ','")
+
+                # check the number of decimal digits and crop to 4
+                if '.' in x:  # do only for float number
+                    lx = len(x.split('.')[1])  # get decimals
+                    if lx > 4:  # crop size to 4
+                        x = x[:(4 - lx)]
+                        lx = 4
+                if '.' in y:  # do only for float number
+                    ly = len(y.split('.')[1])
+                    if ly > 4:
+                        y = y[:(4 - ly)]
+                        ly = 4
+
+                # select a symbol size according
+                # for the size take the bigger number of digits of the two numbers
+                ndigits = max([lx, ly])
+                if ndigits == 0:
+                    size = 5
+                elif ndigits == 1:
+                    size = 4
+                elif ndigits == 2:
+                    size = 3
+                elif ndigits == 3:
+                    size = 2
+                elif ndigits == 4:
+                    size = 1
+
+                #upload to database, the geometry is built by the same statement
+                utils.pgprepare(cur, "insert_bookmark", INSERT_BOOKMARK,
+                                ["float8", "float8", "varchar", "smallint", "varchar"])
+                cur.execute("""EXECUTE insert_bookmark (%s, %s, %s, %s, %s)""", (y, x, label, size, state))
+                id = cur.fetchone()[0]
+                conn.commit()
+
+            else:
+                raise Exception("the point is not inside USA")
 
     except Exception as e:
         raise Exception(e)
 
     else:
-        return x, y, size #return the cropped coordinates and marker size
-
-    finally:
-        if cur: cur = None
-        if conn: conn = None
+        return x, y, size, id #return the cropped coordinates, marker size and bookmark id
 
 
 def get_epsg(path):
@@ -553,6 +662,11 @@ if __name__ == '__main__':
     print("Welcome. To quit the program type q")
     print("This program will use the folder " + os.path.dirname(os.path.abspath(__file__)) +" to download data and images")
     exists = check_table()
+    if exists and not check_table(tablename=settings.STATES_SUBDIVIDED):
+        print("Creating the table '" + settings.STATES_SUBDIVIDED_TABLE_NAME + "' used to check the points")
+        with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+            containment.build_subdivided(cur)
+            conn.commit()
     if exists: print("The table 'exercise.states' already exists and will be used. Drop it if a new table is required")
 
     while True:
@@ -604,11 +718,14 @@ if __name__ == '__main__':
             if epsg != "4326":
                 print("Coordinate system is epgs:" + epsg)
                 print("Coordinate system will be converted to epgs:4326")
-                print("reprojecting....")
-                dataset = reproject_vector(folder + "/" + base + '/' + shapename, epsg_from=int(epsg), epsg_to=4326)
-                print("overwrite shapefile...")
-                save_vector(dataset, folder + "/" + base + '/' + shapename, driver=None)
-                dataset = None
+                if settings.SHAPE_LOADER == "copy":
+                    # the copy loader reprojects the features while it uploads them
+                    print("the features will be reprojected while they are uploaded")
+                else:
+                    print("reprojecting....")
+                    # features are written to the shapefile while they are read, no copy is kept in memory
+                    reproject.reproject_file(folder + "/" + base + '/' + shapename, folder + "/" + base + '/' + shapename,
+                                             4326, int(epsg))
 
             print("uploading states")
             upload_shape(folder + "/" + base + '/' + shapename)
@@ -663,7 +780,7 @@ if __name__ == '__main__':
 
             try:
                 #check point, fix it, and upload to database
-                x,y,size = upload_point(valuex,valuey, valuel)
+                x,y,size,id = upload_point(valuex,valuey, valuel)
                 print("long(x)= " + x + " lat(y)=" + y + " label= " + valuel + " size= " + str(size))
                 #print(x,y,size)
                 print("plotting... you will need to close the plot to continue")
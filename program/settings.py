@@ -18,6 +18,31 @@ TILES = "CartoDB positron"
 
 DEFAULT_CONNECTION = {"dbname": "exercise", "user": "user", "password": "user", "port":"5432", "host": "127.0.0.1"}
 
+###### connection pool
+POOL_MINCONN = 2        # idle connections kept open
+POOL_MAXCONN = 10       # maximum connections open at the same time
+POOL_TIMEOUT = 30       # seconds to wait for a free connection
+POOL_HEALTHCHECK = 30   # seconds of idleness after which a connection is tested before use
+
+###### downloads, the file is downloaded from its url or from the first mirror that works,
+###### mirrors are base urls such as "file:///C:/data/" or "http://127.0.0.1:8000/"
+DOWNLOAD_MIRRORS = []
+DOWNLOAD_CHECKSUMS = {}     # expected sha256 for each file name, files not listed are not checked
+DOWNLOAD_CHUNK = 1024 * 1024    # bytes written at a time
+DOWNLOAD_TIMEOUT = 60       # seconds
+DOWNLOAD_RETRIES = 3        # a broken download is resumed from the same url this number of times
+
+###### zip files
+READ_ZIPPED = True          # check and read the shapefile inside the zip file, extract it only when needed
+UNZIP_CHUNK = 1024 * 1024   # bytes extracted at a time
+
+###### point in USA check
+CONTAINMENT_IN_MEMORY = True    # check points with the in memory states index, if False or not available use PostGIS
+CONTAINMENT_CELLSIZE = 1.0      # size in degrees of the index grid cells
+
+###### bulk import
+BULK_CHUNK = 50000      # rows checked and copied to the database at a time
+
 
 OGR_CONNECTION = "PG:host="+DEFAULT_CONNECTION["host"]+" dbname="+DEFAULT_CONNECTION["dbname"]\
                  +" user="+DEFAULT_CONNECTION["user"]+" password="+DEFAULT_CONNECTION["password"]
@@ -26,9 +51,85 @@ STATES = "states"
 STATES_TABLE_NAME = DEFAULT_SCHEMA + "." + STATES
 BOOKMARKS = "bookmarks"
 BOOKMARKS_TABLE_NAME = DEFAULT_SCHEMA + "." + BOOKMARKS
+STATES_SUBDIVIDED = "states_subdivided"
+STATES_SUBDIVIDED_TABLE_NAME = DEFAULT_SCHEMA + "." + STATES_SUBDIVIDED
+SUBDIVIDE_VERTICES = 255    # maximum number of vertices of the subdivided states pieces
+STATES_GEOJSON = "states_geojson"
+STATES_GEOJSON_TABLE_NAME = DEFAULT_SCHEMA + "." + STATES_GEOJSON
+
+###### simplified states for the web map, one level for each tuple (minimum map zoom, tolerance in degrees, decimal digits)
+###### the map uses the level with the biggest minimum zoom not greater than the map zoom
+SIMPLIFY_LEVELS = [(0, 0.05, 2), (4, 0.01, 3), (6, 0.002, 4), (9, 0, 6)]
+MAP_ZOOM = 3
+MAP_CENTER = [48, -102]     # latitude, longitude
+MAP_SIZE = (1280, 800)      # width and height in screen pixels of the map view used to select the bookmarks
+BOOKMARKS_PAGESIZE = 10000  # bookmarks read from the database at a time
+BOOKMARKS_STREAM = True     # read the bookmarks with a server side cursor instead of pages
+BOOKMARKS_ITERSIZE = 10000  # bookmarks received from the server side cursor at a time
+
+###### bookmarks renderer, "markers" draws a font-awesome marker for each bookmark, "canvas" draws all the bookmarks
+###### as circles on one canvas, "auto" uses markers for up to MARKERS_MAX bookmarks and the canvas for more
+POINTS_RENDERER = "auto"
+MARKERS_MAX = 1000
+
+###### map mode, "inline" writes states and bookmarks inside the html page,
+###### "tiles" reads them as vector tiles from the local tile server,
+###### "layers" writes the page once and reads states and bookmarks from separate files next to it
+MAP_MODE = "inline"
+BOOKMARKS_FILE = "bookmarks.js"     # bookmarks file of the "layers" mode, the only file written again on updates
+TILE_HOST = "127.0.0.1"
+TILE_PORT = 8765
+TILE_EXTENT = 4096      # tile size in tile coordinates
+TILE_BUFFER = 64        # tile buffer in tile coordinates
+TILE_CACHE_SIZE = 2000  # number of tiles kept in memory
+TILE_CHECK_SECONDS = 10 # cached tiles are dropped if the table changed, checked at most once in this time; None to never check
+VECTORGRID_JS = "https://unpkg.com/leaflet.vectorgrid@1.3.0/dist/Leaflet.VectorGrid.bundled.js"
+
+###### live map updates, if True new bookmarks are added to the page shown by the browser
+###### without writing and reloading index.html
+LIVE_UPDATE = False
+LIVE_CHUNK = 5000       # bookmarks sent to the browser at a time
+
+###### batch rendering of map images with headless browsers
+FARM_WORKERS = 4        # number of browsers working at the same time
+FARM_ZOOM = 8           # map zoom of the bookmark images
+FARM_TIMEOUT = 30       # seconds to wait for the map tiles of one image
+FARM_FOLDER = None      # if None use the "renders" folder inside the program folder
+
+###### screenshots, IMAGE_FORMAT is "png" (written as taken, fastest), "jpeg" or "webp"
+IMAGE_FORMAT = "jpeg"
+IMAGE_QUALITY = 75      # jpeg and webp quality, 1 to 100, 75 is the PIL default
+IMAGE_DPI = 200         # resolution written in jpeg files
+IMAGE_WEBP_METHOD = 0   # webp encoder effort, 0 is fastest, 6 is smallest
+IMAGE_ASYNC = True      # encode and write images in background threads
+IMAGE_WRITERS = 2       # number of writer threads
+IMAGE_QUEUE_SIZE = 16   # images waiting to be written, saving waits when the queue is full
+
+###### showall mode, "markers" draws one marker for each bookmark,
+###### "clusters" groups the bookmarks in the database and draws one circle for each group
+SHOWALL_MODE = "markers"
+CLUSTER_PIXELS = 60     # size in screen pixels of the grid cells used to group the bookmarks
+
+###### matplotlib renderer
+PLOT_LABELS_MAX = 500   # if there are more labels, overlapping labels are skipped and at most this number is drawn
+                        # (biggest bookmarks first), matplotlib draws each label on its own; None draws every label
+EXPORT_WORKERS = None   # processes of the batch export, if None one for each cpu
+EXPORT_FOLDER = None    # folder of the batch export images, if None use the "exports" folder inside the program folder
+
+###### disk cache of the states geojson
+CACHE_FOLDER = None     # if None use the "cache" folder inside the program folder
+CACHE_COMPRESSION = 6   # gzip compression level, 1 is fastest, 9 is smallest
 
 SHAPE_MANDATORY_FILES = {"shp", "shx", "dbf"}
+SHAPE_SAMPLE = 100  # records of a shapefile checked when it is validated, the rest of the file is not read
 SHP2PGSQL =PGBIN + "/shp2pgsql.exe"
+SHAPE_LOADER = "copy"       # "copy" loads the shapefile with OGR and a binary COPY, "shp2pgsql" uses SHP2PGSQL
+LOAD_CHUNK = 1000           # features encoded at a time by the COPY loader
+LOAD_BUFFER = 1024 * 1024   # bytes sent to the database at a time by the COPY loader
+INGEST_PARALLEL_MIN = 20000 # layers with at least this number of features are loaded by a pool of processes
+INGEST_WORKERS = None       # processes loading a big layer, if None one for each cpu
+INGEST_CHUNK = 5000         # features loaded by a process at a time
+REPROJECT_CHUNK = 2000      # features reprojected together, their coordinates are transformed with one pyproj call
 PGSQL = PGBIN + "/psql.exe"
 PGUSER = "user"
 PGPASSW = "user"
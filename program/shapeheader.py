@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name:        shapeheader.py
+# Purpose:     check a shapefile reading only the headers of the .shp, .shx and .dbf files,
+#               shape type, bounding box and record counts are read without parsing any geometry;
+#               optionally a sample of records is checked through the .shx offsets
+#
+# Author:      claudio piccinini
+#
+# Updated:     18/10/2026
+#-------------------------------------------------------------------------------
+
+import os
+import struct
+import random
+import zipfile
+
+import settings
+
+
+# shape type codes of the .shp header
+SHAPE_TYPES = {0: "Null Shape", 1: "Point", 3: "PolyLine", 5: "Polygon", 8: "MultiPoint",
+               11: "PointZ", 13: "PolyLineZ", 15: "PolygonZ", 18: "MultiPointZ",
+               21: "PointM", 23: "PolyLineM", 25: "PolygonM", 28: "MultiPointM", 31: "MultiPatch"}
+
+POLYGON_TYPES = (5, 15, 25)
+
+
+def read_main_header(data, name):
+    """
+    Parse the 100 bytes header shared by .shp and .shx files
+    :param data: the first 100 bytes of the file
+    :param name: the file name, used in the error messages
+    :return: (file length in bytes, shape type, (xmin, ymin, xmax, ymax))
+    """
+    if len(data) < 100:
+        raise Exception(name + " is too short to be a shapefile")
+    code, = struct.unpack(">i", data[0:4])
+    length, = struct.unpack(">i", data[24:28])
+    version, shapetype = struct.unpack("<ii", data[28:36])
+    bbox = struct.unpack("<4d", data[36:68])
+    if code != 9994 or version != 1000:
+        raise Exception(name + " is not a shapefile")
+    if shapetype not in SHAPE_TYPES:
+        raise Exception(name + " has an unknown shape type " + str(shapetype))
+    return length * 2, shapetype, bbox
+
+
+def read_dbf_header(data, name):
+    """
+    Parse the first 32 bytes of a .dbf file
+    :param data: the first 32 bytes of the file
+    :param name: the file name, used in the error messages
+    :return: (number of records, header length, record length)
+    """
+    if len(data) < 32:
+        raise Exception(name + " is too short to be a dbf file")
+    return struct.unpack("<IHH", data[4:12])
+
+
+def check(shp, shx, dbf, sizes, sample=0, name="shapefile"):
+    """
+    Check the headers of a shapefile and that the three files agree with each other
+    :param shp: binary file object of the .shp file, at its start
+    :param shx: binary file object of the .shx file, at its start
+    :param dbf: binary file object of the .dbf file, at its start
+    :param sizes: (shp size, shx size, dbf size) in bytes
+    :param sample: number of records checked, reading their position in the .shx and their shape type in the .shp;
+     shp and shx must support seek when sample is not 0
+    :param name: the shapefile name, used in the error messages
+    :return: a dictionary with shapetype, bbox and count
+    """
+    shpsize, shxsize, dbfsize = sizes
+
+    length, shapetype, bbox = read_main_header(shp.read(100), name + ".shp")
+    if length != shpsize:
+        raise Exception(name + ".shp should be " + str(length) + " bytes, it is " + str(shpsize) + " bytes")
+
+    shxlength, shxtype, shxbbox = read_main_header(shx.read(100), name + ".shx")
+    if shxlength != shxsize or (shxsize - 100) % 8:
+        raise Exception(name + ".shx is damaged")
+    if shxtype != shapetype:
+        raise Exception(name + ".shx and " + name + ".shp have different shape types")
+    count = (shxsize - 100) // 8
+
+    dbfcount, headerlength, recordlength = read_dbf_header(dbf.read(32), name + ".dbf")
+    if dbfcount != count:
+        raise Exception(name + ".dbf has " + str(dbfcount) + " records, " + name + ".shx has " + str(count))
+    if dbfsize < headerlength + dbfcount * recordlength:
+        raise Exception(name + ".dbf is shorter than its " + str(dbfcount) + " records")
+
+    for i in sorted(random.sample(range(count), min(sample, count))):
+        shx.seek(100 + i * 8)
+        offset, contentlength = struct.unpack(">ii", shx.read(8))
+        offset, contentlength = offset * 2, contentlength * 2
+        if offset < 100 or offset + 8 + contentlength > shpsize:
+            raise Exception("record " + str(i) + " of " + name + " is outside " + name + ".shp")
+        shp.seek(offset)
+        number, recordlength = struct.unpack(">ii", shp.read(8))
+        recordtype, = struct.unpack("<i", shp.read(4))
+        if number != i + 1 or recordlength * 2 != contentlength or recordtype not in (0, shapetype):
+            raise Exception("record " + str(i) + " of " + name + " is damaged")
+
+    return {"shapetype": shapetype, "bbox": bbox, "count": count}
+
+
+def find_files(names, shpname):
+    """
+    Find the .shx and .dbf files of a .shp file, extensions may be upper or lower case
+    :param names: list of available file names
+    :param shpname: name of the .shp file
+    :return: (shx name, dbf name)
+    """
+    stem = os.path.splitext(shpname)[0]
+    found = {}
+    for n in names:
+        s, ext = os.path.splitext(n)
+        if s == stem and ext.lower() in (".shx", ".dbf"):
+            found[ext.lower()] = n
+    if len(found) < 2:
+        raise Exception("A shapefile should contain " + str(settings.SHAPE_MANDATORY_FILES))
+    return found[".shx"], found[".dbf"]
+
+
+def check_files(path, sample=settings.SHAPE_SAMPLE):
+    """
+    Check a shapefile on disk, reading only its headers and a sample of records
+    :param path: path to the .shp file
+    :param sample: number of records checked
+    :return: a dictionary with shapetype, bbox and count
+    """
+    folder = os.path.dirname(path) or "."
+    shx, dbf = find_files([folder + "/" + n for n in os.listdir(folder)], folder + "/" + os.path.basename(path))
+    with open(path, "rb") as f1, open(shx, "rb") as f2, open(dbf, "rb") as f3:
+        sizes = (os.path.getsize(path), os.path.getsize(shx), os.path.getsize(dbf))
+        return check(f1, f2, f3, sizes, sample, os.path.splitext(os.path.basename(path))[0])
+
+
+def check_zip(zippath, shpname, sample=0):
+    """
+    Check a shapefile inside a zip file without extracting it, reading only its headers and a sample of records;
+    the sample is slow for compressed files, as each seek decompresses the file again
+    :param zippath: path to the zip file
+    :param shpname: name of the .shp file in the zip file
+    :param sample: number of records checked
+    :return: a dictionary with shapetype, bbox and count
+    """
+    with zipfile.ZipFile(zippath) as z:
+        shx, dbf = find_files(z.namelist(), shpname)
+        with z.open(shpname) as f1, z.open(shx) as f2, z.open(dbf) as f3:
+            sizes = (z.getinfo(shpname).file_size, z.getinfo(shx).file_size, z.getinfo(dbf).file_size)
+            return check(f1, f2, f3, sizes, sample, os.path.splitext(os.path.basename(shpname))[0])
@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name:        shapeload.py
+# Purpose:     load a vector layer into a postgis table with a binary COPY, features are read with OGR
+#               and sent to the database while they are read, memory does not depend on the layer size;
+#               big layers can be loaded in chunks of features by a pool of processes
+#
+# Author:      claudio piccinini
+#
+# Updated:     18/10/2026
+#-------------------------------------------------------------------------------
+
+import time
+import struct
+import datetime
+import multiprocessing
+
+from osgeo import ogr
+from psycopg2.extensions import AsIs
+
+import utils
+import settings
+import reproject
+
+
+# binary COPY header: signature, flags, header extension length
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+COPY_TRAILER = struct.pack(">h", -1)
+
+# EWKB flag of the geometries with a srid
+EWKB_SRID = 0x20000000
+
+POSTGRES_EPOCH = datetime.date(2000, 1, 1)
+
+NULL = struct.pack(">i", -1)
+
+# a field is null if it is not set, GDAL 2.2 can also store null fields
+is_set = getattr(ogr.Feature, "IsFieldSetAndNotNull", ogr.Feature.IsFieldSet)
+
+
+class CopyStream(object):
+    """ A file-like object read by COPY, the data is made from a generator of bytes only when COPY asks for it """
+
+    def __init__(self, chunks):
+        """
+        :param chunks: an iterable of bytes
+        """
+        self._chunks = iter(chunks)
+        self._buffer = bytearray()
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+def get_columns(layer):
+    """
+    Columns for the attributes of a layer, names are lower case as shp2pgsql does
+    :param layer: an OGR layer
+    :return: list of (column name, postgresql type, encoder), an encoder gives the binary COPY value of a field
+    """
+    columns = []
+    definition = layer.GetLayerDefn()
+    for i in range(definition.GetFieldCount()):
+        field = definition.GetFieldDefn(i)
+        ftype = field.GetType()
+        name = field.GetName().lower()
+        if ftype == ogr.OFTInteger:
+            columns.append((name, "integer", lambda f, i: struct.pack(">i", f.GetFieldAsInteger(i))))
+        elif ftype == ogr.OFTInteger64:
+            columns.append((name, "bigint", lambda f, i: struct.pack(">q", f.GetFieldAsInteger64(i))))
+        elif ftype == ogr.OFTReal:
+            columns.append((name, "double precision", lambda f, i: struct.pack(">d", f.GetFieldAsDouble(i))))
+        elif ftype == ogr.OFTDate:
+            columns.append((name, "date", lambda f, i: struct.pack(
+                ">i", (datetime.date(*f.GetFieldAsDateTime(i)[:3]) - POSTGRES_EPOCH).days)))
+        else:
+            # strings and any other type are stored as text
+            width = field.GetWidth() if ftype == ogr.OFTString else 0
+            columns.append((name, "varchar(" + str(width) + ")" if width else "varchar",
+                            lambda f, i: f.GetFieldAsString(i).encode("utf-8")))
+    return columns
+
+
+def get_geometry_type(layer):
+    """
+    Column type of the layer geometries, polygons are stored as multipolygons as shp2pgsql does;
+    the column has the Z and M dimensions of the layer, for example MultiPolygonZ for a PolygonZ shapefile
+    :param layer: an OGR layer
+    :return: (postgresql geometry type name, True if polygons must be changed to multipolygons)
+    """
+    layertype = layer.GetGeomType()
+    dims = ("Z" if ogr.GT_HasZ(layertype) else "") + ("M" if ogr.GT_HasM(layertype) else "")
+    gtype = ogr.GT_Flatten(layertype)
+    if gtype in (ogr.wkbPolygon, ogr.wkbMultiPolygon):
+        return "MultiPolygon" + dims, True
+    if gtype in (ogr.wkbLineString, ogr.wkbMultiLineString):
+        return "MultiLineString" + dims, False
+    if gtype == ogr.wkbPoint:
+        return "Point" + dims, False
+    return "Geometry" + dims, False
+
+
+def create_table(cur, tablename, layer, srid=4326, unlogged=False, primarykey=True):
+    """
+    Create (or replace) a table for the features of a layer, with a gid serial primary key, the attributes and geom
+    :param cur: a database cursor
+    :param tablename: the table name with the schema
+    :param layer: an OGR layer
+    :param srid: the srid of the geometries
+    :param unlogged: if True create an unlogged table, faster to load but emptied after a server crash
+    :param primarykey: if False gid is not a primary key yet, the key can be added after loading the data
+    :return: list of the columns, see get_columns
+    """
+    columns = get_columns(layer)
+    gname, multi = get_geometry_type(layer)
+    cur.execute("""DROP TABLE IF EXISTS %s""", (AsIs(tablename),))
+    cur.execute("""CREATE """ + ("UNLOGGED " if unlogged else "") + """TABLE %s (gid serial""" +
+                (" PRIMARY KEY" if primarykey else "") + """, %s
+                    geom geometry(%s, %s))""",
+                (AsIs(tablename), AsIs("".join('"' + c[0] + '" ' + c[1] + ", " for c in columns)), AsIs(gname), srid))
+    return columns
+
+
+def encode_feature(feature, columns, srid=4326, multi=True, gid=False):
+    """
+    Binary COPY tuple of a feature, attributes followed by the geometry as EWKB
+    :param feature: an OGR feature
+    :param columns: the columns, see get_columns
+    :param srid: the srid of the geometry
+    :param multi: if True change polygons to multipolygons
+    :param gid: if True start with the gid, the feature id + 1
+    :return: bytes
+    """
+    parts = [struct.pack(">h", len(columns) + (2 if gid else 1))]
+    if gid:
+        parts.append(struct.pack(">ii", 4, feature.GetFID() + 1))
+    for i, (name, ptype, encoder) in enumerate(columns):
+        if not is_set(feature, i):
+            parts.append(NULL)
+        else:
+            value = encoder(feature, i)
+            parts.append(struct.pack(">i", len(value)))
+            parts.append(value)
+
+    geom = feature.GetGeometryRef()
+    if geom is None:
+        parts.append(NULL)
+    else:
+        if multi:
+            geom = ogr.ForceToMultiPolygon(geom)
+        # iso wkb keeps the Z and M dimensions apart, postgis reads the iso type codes
+        wkb = geom.ExportToIsoWkb(ogr.wkbNDR)
+        # little endian wkb: byte order, type, coordinates; the srid goes after the type
+        gtype, = struct.unpack("<I", wkb[1:5])
+        ewkb = wkb[0:1] + struct.pack("<II", gtype | EWKB_SRID, srid) + wkb[5:]
+        parts.append(struct.pack(">i", len(ewkb)))
+        parts.append(ewkb)
+    return b"".join(parts)
+
+
+def iter_copy_data(features, columns, srid=4326, multi=True, gid=False, chunksize=settings.LOAD_CHUNK):
+    """
+    Binary COPY data of features, the header, groups of chunksize features and the trailer
+    :param features: an iterable of OGR features
+    :param columns: the columns, see get_columns
+    :param srid: the srid of the geometries
+    :param multi: if True change polygons to multipolygons
+    :param gid: if True send the gid of each feature
+    :param chunksize: number of features in each bytes object
+    :return: a generator of bytes
+    """
+    yield COPY_HEADER
+    rows = []
+    for feature in features:
+        rows.append(encode_feature(feature, columns, srid, multi, gid))
+        if len(rows) == chunksize:
+            yield b"".join(rows)
+            rows = []
+    if rows:
+        yield b"".join(rows)
+    yield COPY_TRAILER
+
+
+def copy_data(cur, tablename, columns, data, gid=False):
+    """
+    Send binary COPY data to a table
+    :param cur: a database cursor
+    :param tablename: the table name with the schema
+    :param columns: the columns, see get_columns
+    :param data: an iterable of bytes, see iter_copy_data
+    :param gid: if True the data has the gid of each feature
+    :return: None
+    """
+    names = ("gid, " if gid else "") + "".join('"' + c[0] + '", ' for c in columns) + "geom"
+    cur.copy_expert("COPY " + tablename + " (" + names + ") FROM STDIN WITH (FORMAT binary)", CopyStream(data),
+                    size=settings.LOAD_BUFFER)
+
+
+def finish_table(cur, tablename, indexname):
+    """
+    Create the spatial index of a loaded table and update its statistics
+    :param cur: a database cursor
+    :param tablename: the table name with the schema
+    :param indexname: the index name
+    :return: None
+    """
+    cur.execute("""CREATE INDEX %s ON %s USING GIST(geom)""", (AsIs(indexname), AsIs(tablename)))
+    cur.execute("""ANALYZE %s""", (AsIs(tablename),))
+
+
+def load(cur, path, tablename, srid=4326):
+    """
+    Load the first layer of a vector file into a new table, the index is created after the data is loaded
+    :param cur: a database cursor, the caller commits
+    :param path: the path to the file, GDAL virtual paths such as /vsizip/ can be used
+    :param tablename: the table name with the schema
+    :param srid: the srid of the table, geometries in another coordinate system are reprojected
+    :return: number of features loaded
+    """
+    dataset = ogr.Open(path, 0)
+    if dataset is None:
+        raise Exception("cannot open " + path)
+    try:
+        layer = dataset.GetLayer()
+        count = layer.GetFeatureCount()
+        columns = create_table(cur, tablename, layer, srid)
+        multi = get_geometry_type(layer)[1]
+        features = iter(layer.GetNextFeature, None)
+        transformer = reproject.get_layer_transformer(layer, srid)
+        if transformer is not None:
+            features = reproject.iter_reprojected(features, transformer)
+        copy_data(cur, tablename, columns, iter_copy_data(features, columns, srid, multi))
+        # the index name used by shp2pgsql
+        finish_table(cur, tablename, tablename.split(".")[-1] + "_geom_idx")
+        return count
+    finally:
+        dataset = None
+
+
+def count_features(path):
+    """
+    Number of features of the first layer of a vector file
+    :param path: the path to the file
+    :return: the number of features
+    """
+    dataset = ogr.Open(path, 0)
+    if dataset is None:
+        raise Exception("cannot open " + path)
+    try:
+        return dataset.GetLayer().GetFeatureCount()
+    finally:
+        dataset = None
+
+
+def load_range(path, tablename, srid, start, end):
+    """
+    Load the features with index from start to end (excluded) into an existing table, with its own connection;
+    features are read, reprojected and encoded in this process
+    :param path: the path to the file
+    :param tablename: the table name with the schema, made by create_table
+    :param srid: the srid of the table
+    :param start: index of the first feature
+    :param end: index after the last feature
+    :return: (number of features loaded, seconds)
+    """
+    begin = time.perf_counter()
+    dataset = ogr.Open(path, 0)
+    if dataset is None:
+        raise Exception("cannot open " + path)
+    try:
+        layer = dataset.GetLayer()
+        columns = get_columns(layer)
+        multi = get_geometry_type(layer)[1]
+        layer.SetNextByIndex(start)
+        loaded = [0]  # features read by the generator
+
+        def features():
+            for i in range(end - start):
+                feature = layer.GetNextFeature()
+                if feature is None: return
+                loaded[0] += 1
+                yield feature
+
+        transformer = reproject.get_layer_transformer(layer, srid)
+        data = features()
+        if transformer is not None:
+            data = reproject.iter_reprojected(data, transformer)
+        data = iter_copy_data(data, columns, srid, multi, gid=True)
+        with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+            copy_data(cur, tablename, columns, data, gid=True)
+            conn.commit()
+        return loaded[0], time.perf_counter() - begin
+    finally:
+        dataset = None
+
+
+def _load_range(args):
+    """ unpack the arguments of load_range, used by the pool """
+    return load_range(*args)
+
+
+def parallel_load(path, tablename, srid=4326, workers=settings.INGEST_WORKERS, chunksize=settings.INGEST_CHUNK):
+    """
+    Load the first layer of a vector file into a new table with a pool of processes
+    The layer is split in ranges of chunksize features, each range is read, reprojected and copied by a process
+    with its own connection into an unlogged staging table; the staging table then gets the primary key,
+    is made logged, replaces the table and gets the spatial index
+    :param path: the path to the file, GDAL virtual paths such as /vsizip/ can be used
+    :param tablename: the table name with the schema
+    :param srid: the srid of the table, geometries in another coordinate system are reprojected
+    :param workers: number of processes, if None one for each cpu
+    :param chunksize: number of features in each range
+    :return: number of features loaded
+    """
+    schema, name = tablename.split(".") if "." in tablename else ("public", tablename)
+    staging = name + "_staging"
+
+    dataset = ogr.Open(path, 0)
+    if dataset is None:
+        raise Exception("cannot open " + path)
+    try:
+        layer = dataset.GetLayer()
+        count = layer.GetFeatureCount()
+        with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+            create_table(cur, schema + "." + staging, layer, srid, unlogged=True, primarykey=False)
+            conn.commit()
+    finally:
+        dataset = None
+
+    ranges = [(path, schema + "." + staging, srid, i, min(i + chunksize, count)) for i in range(0, count, chunksize)]
+    pool = multiprocessing.Pool(workers, initializer=utils.forget_pools)
+    try:
+        loaded = sum(r[0] for r in pool.imap_unordered(_load_range, ranges))
+        if loaded != count:
+            # do not replace the table with an incomplete one
+            raise Exception(str(loaded) + " of " + str(count) + " features of " + path + " were loaded")
+    except Exception:
+        pool.terminate()
+        with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+            cur.execute("""DROP TABLE IF EXISTS %s""", (AsIs(schema + "." + staging),))
+            conn.commit()
+        raise
+    finally:
+        pool.close()
+        pool.join()
+
+    with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+        table = AsIs(schema + "." + staging)
+        cur.execute("""ALTER TABLE %s ADD PRIMARY KEY (gid)""", (table,))
+        cur.execute("""SELECT setval(pg_get_serial_sequence(%s, 'gid'), coalesce(max(gid), 0) + 1, false) FROM %s""",
+                    (schema + "." + staging, table))
+        cur.execute("""ALTER TABLE %s SET LOGGED""", (table,))
+        # hand over, in the same transaction readers see the old table or the new one
+        cur.execute("""DROP TABLE IF EXISTS %s""", (AsIs(schema + "." + name),))
+        cur.execute("""ALTER TABLE %s RENAME TO %s""", (table, AsIs(name)))
+        cur.execute("""ALTER INDEX %s RENAME TO %s""", (AsIs(schema + "." + staging + "_pkey"), AsIs(name + "_pkey")))
+        cur.execute("""ALTER SEQUENCE %s RENAME TO %s""",
+                    (AsIs(schema + "." + staging + "_gid_seq"), AsIs(name + "_gid_seq")))
+        finish_table(cur, schema + "." + name, name + "_geom_idx")
+        conn.commit()
+    return loaded
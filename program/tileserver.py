@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+#-------------------------------------------------------------------------------
+# Name:        tileserver.py
+# Purpose:     local http server of Mapbox Vector Tiles made by PostGIS for the states and the bookmarks,
+#               tiles are served as /{layer}/{z}/{x}/{y}.pbf and kept in a LRU cache, the cached tiles of a layer
+#               are dropped when the row count or the max key of its table change
+#               run as "python tileserver.py" or start it in a thread with start()
+#
+# Author:      claudio piccinini
+#
+# Updated:     18/10/2026
+#-------------------------------------------------------------------------------
+
+import re
+import time
+import threading
+import socketserver
+from collections import OrderedDict
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from psycopg2.extensions import AsIs
+
+import utils
+import settings
+
+
+# half size of the web mercator world in meters
+WORLD = 20037508.342789244
+
+# layers that can be requested: table, attribute columns and key column
+LAYERS = {
+    settings.STATES: (settings.STATES_TABLE_NAME, "gid, name", "gid"),
+    settings.BOOKMARKS: (settings.BOOKMARKS_TABLE_NAME, "id, label, size, state", "id"),
+}
+
+PATH = re.compile(r"^/(\w+)/(\d+)/(\d+)/(\d+)\.pbf$")
+
+# global variable to store the running server
+SERVER = None
+
+
+class TileCache(object):
+    """ A thread-safe LRU cache of tiles, keyed by (layer, z, x, y) """
+
+    def __init__(self, maxsize=settings.TILE_CACHE_SIZE):
+        """
+        :param maxsize: maximum number of tiles kept
+        """
+        self.maxsize = maxsize
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        :param key: (layer, z, x, y)
+        :return: the tile, None if not in the cache
+        """
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+            return tile
+
+    def put(self, key, tile):
+        """
+        :param key: (layer, z, x, y)
+        :param tile: the tile bytes
+        :return: None
+        """
+        with self._lock:
+            self._tiles[key] = tile
+            self._tiles.move_to_end(key)
+            while len(self._tiles) > self.maxsize:
+                self._tiles.popitem(last=False)
+
+    def invalidate(self, layer=None):
+        """
+        Remove tiles from the cache
+        :param layer: the layer name, if None remove all the tiles
+        :return: None
+        """
+        with self._lock:
+            if layer is None:
+                self._tiles.clear()
+            else:
+                for key in [k for k in self._tiles if k[0] == layer]:
+                    del self._tiles[key]
+
+
+# global tile cache shared by the server threads
+CACHE = TileCache()
+
+# version of the table of each layer seen by the cache: layer -> ((row count, max key), time of the check)
+VERSIONS = {}
+VERSIONS_LOCK = threading.Lock()
+
+
+def invalidate(layer=None):
+    """
+    Remove tiles from the cache, call it when a layer changes (for example when a bookmark is inserted)
+    :param layer: the layer name, if None remove all the tiles
+    :return: None
+    """
+    CACHE.invalidate(layer)
+
+
+def get_version(layer):
+    """
+    Cheap version of the table of a layer, it changes when rows are inserted or deleted
+    :param layer: the layer name, a key of LAYERS
+    :return: (row count, max key)
+    """
+    table, columns, key = LAYERS[layer]
+    with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+        cur.execute("""SELECT count(*), max(%s) FROM %s""", (AsIs(key), AsIs(table)))
+        return tuple(cur.fetchone())
+
+
+def check_version(layer, seconds=settings.TILE_CHECK_SECONDS):
+    """
+    Drop the cached tiles of a layer if its table changed, also when it was changed by another process
+    (bulkimport.py, secondary.py); the table is checked at most once every seconds
+    :param layer: the layer name
+    :param seconds: seconds between two checks, if None the table is not checked and only invalidate() drops tiles
+    :return: None
+    """
+    if seconds is None:
+        return
+    now = time.monotonic()
+    with VERSIONS_LOCK:
+        version, checked = VERSIONS.get(layer, (None, None))
+        if checked is not None and now - checked < seconds:
+            return
+        # the other threads do not check again while this one queries the table
+        VERSIONS[layer] = (version, now)
+    current = get_version(layer)
+    with VERSIONS_LOCK:
+        if version is not None and current != version:
+            CACHE.invalidate(layer)
+        VERSIONS[layer] = (current, now)
+
+
+def tile_envelope(z, x, y):
+    """
+    Bounds of a tile in web mercator
+    :param z: zoom
+    :param x: column
+    :param y: row, from the top
+    :return: (minx, miny, maxx, maxy)
+    """
+    size = 2 * WORLD / 2 ** z
+    minx = -WORLD + x * size
+    maxy = WORLD - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def make_tile(layer, z, x, y):
+    """
+    Build a vector tile with PostGIS
+    :param layer: the layer name, a key of LAYERS
+    :param z: zoom
+    :param x: column
+    :param y: row
+    :return: the tile bytes
+    """
+    table, columns, key = LAYERS[layer]
+    minx, miny, maxx, maxy = tile_envelope(z, x, y)
+    # the features in the tile buffer are needed to draw the tile edges
+    margin = (maxx - minx) * settings.TILE_BUFFER / settings.TILE_EXTENT
+
+    with utils.pgconnection(**settings.DEFAULT_CONNECTION) as conn, conn.cursor() as cur:
+        cur.execute("""SELECT ST_AsMVT(q, %s, %s, 'geom') FROM
+                        (SELECT %s, ST_AsMVTGeom(ST_Transform(t.geom, 3857), ST_MakeEnvelope(%s, %s, %s, %s, 3857),
+                                                 %s, %s, true) AS geom
+                         FROM %s AS t
+                         WHERE t.geom && ST_Transform(ST_MakeEnvelope(%s, %s, %s, %s, 3857), 4326)) AS q
+                        WHERE q.geom IS NOT NULL""",
+                    (layer, settings.TILE_EXTENT, AsIs(columns), minx, miny, maxx, maxy,
+                     settings.TILE_EXTENT, settings.TILE_BUFFER, AsIs(table),
+                     max(minx - margin, -WORLD), max(miny - margin, -WORLD),
+                     min(maxx + margin, WORLD), min(maxy + margin, WORLD)))
+        result = cur.fetchone()[0]
+
+    return bytes(result) if result else b""
+
+
+def get_tile(layer, z, x, y):
+    """
+    Return a tile from the cache, it is built if not in the cache
+    :param layer: the layer name
+    :param z: zoom
+    :param x: column
+    :param y: row
+    :return: the tile bytes
+    """
+    check_version(layer)
+    key = (layer, z, x, y)
+    tile = CACHE.get(key)
+    if tile is None:
+        tile = make_tile(layer, z, x, y)
+        CACHE.put(key, tile)
+    return tile
+
+
+class TileHandler(BaseHTTPRequestHandler):
+    """ Answer GET /{layer}/{z}/{x}/{y}.pbf """
+
+    def do_GET(self):
+        match = PATH.match(self.path.split("?")[0])
+        if not match:
+            self.send_error(404, "use /{layer}/{z}/{x}/{y}.pbf")
+            return
+        layer = match.group(1)
+        z, x, y = int(match.group(2)), int(match.group(3)), int(match.group(4))
+        if layer not in LAYERS:
+            self.send_error(404, "layer should be one of " + ", ".join(sorted(LAYERS)))
+            return
+        if z > 30 or x >= 2 ** z or y >= 2 ** z:
+            self.send_error(400, "tile outside the world")
+            return
+
+        try:
+            tile = get_tile(layer, z, x, y)
+        except Exception as e:
+            self.send_error(500, str(e))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.mapbox-vector-tile")
+        self.send_header("Content-Length", str(len(tile)))
+        # the web page is opened from disk, allow it to read the tiles
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(tile)
+
+    def log_message(self, format, *args):
+        pass  # keep the console for the program messages
+
+
+class TileServer(socketserver.ThreadingMixIn, HTTPServer):
+    """ Tile server answering each request in a new thread """
+    daemon_threads = True
+
+
+def get_url(layer):
+    """
+    Return the tile url template of a layer, as used by Leaflet
+    :param layer: the layer name
+    :return: the url
+    """
+    return "http://" + settings.TILE_HOST + ":" + str(settings.TILE_PORT) + "/" + layer + "/{z}/{x}/{y}.pbf"
+
+
+def start(host=settings.TILE_HOST, port=settings.TILE_PORT):
+    """
+    Start the tile server in a background thread, only the first call starts it
+    :param host: the host to listen to
+    :param port: the port to listen to
+    :return: the server
+    """
+    global SERVER
+    if SERVER is None:
+        SERVER = TileServer((host, port), TileHandler)
+        thread = threading.Thread(target=SERVER.serve_forever, name="tileserver")
+        thread.daemon = True
+        thread.start()
+    return SERVER
+
+
+def stop():
+    """
+    Stop the tile server
+    :return: None
+    """
+    global SERVER
+    if SERVER is not None:
+        SERVER.shutdown()
+        SERVER.server_close()
+        SERVER = None
+
+
+if __name__ == '__main__':
+
+    print("Serving tiles at http://" + settings.TILE_HOST + ":" + str(settings.TILE_PORT) + "/{layer}/{z}/{x}/{y}.pbf")
+    print("layers: " + ", ".join(sorted(LAYERS)) + "; press ctrl+c to stop")
+    server = TileServer((settings.TILE_HOST, settings.TILE_PORT), TileHandler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
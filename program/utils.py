@@ -8,7 +8,20 @@
 # Updated:     07/10/2017
 #-------------------------------------------------------------------------------
 
+import atexit
+import threading
+from contextlib import contextmanager
+
 import psycopg2
+import psycopg2.extensions
+
+import pgpool
+import settings
+
+# connection pools, one for each set of connection parameters
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+_FORGOTTEN = []
 
 def run_tool(params):
     """ run an executable tool (exe, bat,..)
@@ -21,6 +34,14 @@ def run_tool(params):
     out, err = p.communicate()
     return bytes.decode(out), bytes.decode(err)
 
+class Connection(psycopg2.extensions.connection):
+    """ A psycopg2 connection that remembers the names of the statements prepared on the server """
+
+    def __init__(self, *args, **kwargs):
+        super(Connection, self).__init__(*args, **kwargs)
+        self.prepared = set()
+
+
 def pgconnect(**kwargs):
     """ Connect to a postgresql database
     call as pgconnect(**kwargs) where kwargs  is something like
@@ -31,9 +52,71 @@ def pgconnect(**kwargs):
     connstring = ""
     for i in kwargs:connstring += str(i) +"="+ kwargs[i]+ " "
     #print(connstring)
-    conn = psycopg2.connect(connstring)
+    conn = psycopg2.connect(connstring, connection_factory=Connection)
     return conn
 
 
+def pgprepare(cur, name, sql, types=None):
+    """ Prepare a statement on the server, only the first time it is used with a connection
+    the statement is then run with cur.execute("EXECUTE name (%s, %s)", params)
+    :param cur: a cursor of a connection created with pgconnect
+    :param name: the statement name
+    :param sql: the statement, parameters are written as $1, $2,...
+    :param types: list of the parameter type names, if None the types are inferred by the server
+    :return: None
+    """
+    conn = cur.connection
+    if name not in conn.prepared:
+        cur.execute("PREPARE " + name + ("(" + ", ".join(types) + ")" if types else "") + " AS " + sql)
+        conn.prepared.add(name)
+
+
+def get_pool(**kwargs):
+    """ Return the connection pool for a postgresql database, the pool is created on first use
+    call as get_pool(**kwargs) with the same kwargs used for pgconnect
+    :param **kwargs :   a dictionary with connection
+    :return: a pgpool.ConnectionPool
+    """
+    key = tuple(sorted(kwargs.items()))
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = pgpool.ConnectionPool(pgconnect, minconn=settings.POOL_MINCONN, maxconn=settings.POOL_MAXCONN,
+                                         timeout=settings.POOL_TIMEOUT, healthcheck=settings.POOL_HEALTHCHECK, **kwargs)
+            _POOLS[key] = pool
+        return pool
+
+
+@contextmanager
+def pgconnection(**kwargs):
+    """ Check out a pooled connection to a postgresql database, the connection goes back to the pool at the end
+    of the with block and any transaction not committed is rolled back
+    with pgconnection(**kwargs) as conn:
+        cur = conn.cursor()
+    :param **kwargs :   a dictionary with connection
+    :return: postgresql connection
+    """
+    with get_pool(**kwargs).connection() as conn:
+        yield conn
+
+
+@atexit.register
+def close_pools():
+    """ Close all the connection pools, called at exit """
+    with _POOLS_LOCK:
+        for pool in _POOLS.values():
+            pool.closeall()
+        _POOLS.clear()
+
+
+def forget_pools():
+    """ Forget the pools inherited from the parent process after a fork without closing them,
+    their connections belong to the parent process; new pools are created on next use.
+    The old pools are kept alive, a connection garbage collected would close the session of the parent """
+    with _POOLS_LOCK:
+        _FORGOTTEN.extend(_POOLS.values())
+        _POOLS.clear()
+
+
 # function used to style a geojson layer
 style_function = lambda x: {'fillColor': 'yellow', 'fillOpacity': 0.1, 'color': 'black', 'opacity':0.1}
\ No newline at end of file